@@ -38,6 +38,15 @@ app.config["OUTPUT_AUDIOS"] = os.path.normpath(
     os.path.join(BASE_DIR, "temp", "output_audios")
 )
 app.config["TEMP_FOLDER"] = os.path.normpath(os.path.join(BASE_DIR, "temp", "temps"))
+app.config["TRANSCRIPTS_FOLDER"] = os.path.normpath(
+    os.path.join(BASE_DIR, "temp", "transcripts")
+)
+app.config["MEDIA_CACHE_FOLDER"] = os.path.normpath(
+    os.path.join(BASE_DIR, "temp", "media_cache")
+)
+app.config["LLM_CACHE_PATH"] = os.path.normpath(
+    os.getenv("LLM_CACHE_PATH") or os.path.join(BASE_DIR, "temp", "llm_cache.db")
+)
 
 # Create directories if they don't exist
 for directory in [
@@ -46,15 +55,47 @@ for directory in [
     app.config["OUTPUT_IMAGES"],
     app.config["OUTPUT_AUDIOS"],
     app.config["TEMP_FOLDER"],
+    app.config["TRANSCRIPTS_FOLDER"],
+    app.config["MEDIA_CACHE_FOLDER"],
 ]:
     os.makedirs(directory, exist_ok=True)
 
 # Initialize extensions
 db.init_app(app)
 
+# Columns added to existing tables since they were first created. create_all()
+# only creates missing tables, so these are added to older databases here
+ADDED_COLUMNS = [
+    ("script", "timings"),
+    ("script", "language"),
+    ("you_tube_source", "transcript_data"),
+]
+
+
+def add_missing_columns():
+    """Add ADDED_COLUMNS to existing tables that don't have them yet"""
+    from sqlalchemy import inspect, text
+
+    inspector = inspect(db.engine)
+    for table_name, column_name in ADDED_COLUMNS:
+        if not inspector.has_table(table_name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        if column_name in existing:
+            continue
+        column = db.metadata.tables[table_name].columns[column_name]
+        column_type = column.type.compile(dialect=db.engine.dialect)
+        print(f"Adding column {table_name}.{column_name}")
+        with db.engine.begin() as connection:
+            connection.execute(
+                text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}")
+            )
+
+
 # Create database tables
 with app.app_context():
     db.create_all()
+    add_missing_columns()
 
 
 # Import routes for each step
@@ -65,6 +106,7 @@ from routes.youtube import *
 from routes.upload import *
 from routes.video import *
 from routes.shorts import *
+from routes.captions import *
 from routes.index import *
 
 
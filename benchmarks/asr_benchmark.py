@@ -0,0 +1,121 @@
+"""
+Compare ASR backends on a fixed set of local audio clips.
+
+Every clip in the directory (wav/mp3/m4a/mp4) needs a reference transcript
+next to it with the same name and a .txt extension. For each backend the
+script reports model load time, word error rate (WER) and real-time factor
+(inference time / audio duration).
+
+Run from the project root:
+    python -m benchmarks.asr_benchmark path/to/clips --model-size base
+"""
+
+import argparse
+import os
+import re
+import time
+
+import generate_captions
+
+CLIP_EXTENSIONS = (".wav", ".mp3", ".m4a", ".mp4")
+
+
+def normalize(text):
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level Levenshtein distance divided by the reference length"""
+    ref, hyp = normalize(reference), normalize(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (ref_word != hyp_word),
+                )
+            )
+        previous = current
+    return previous[-1] / max(1, len(ref))
+
+
+def load_clips(directory):
+    clips = []
+    for name in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(name)
+        reference_path = os.path.join(directory, f"{stem}.txt")
+        if ext.lower() in CLIP_EXTENSIONS and os.path.exists(reference_path):
+            with open(reference_path, "r", encoding="utf-8") as f:
+                reference = f.read()
+            audio = generate_captions.load_audio(os.path.join(directory, name))
+            clips.append((name, audio, reference))
+    return clips
+
+
+def run_backend(backend, clips, model_size, compute_type):
+    asr_backend = generate_captions.get_asr_backend(backend)
+    model, load_time = generate_captions.get_whisper_model(
+        model_size, compute_type=compute_type, backend=backend
+    )
+
+    total_audio = total_time = total_errors = total_words = 0.0
+    for name, audio, reference in clips:
+        start = time.perf_counter()
+        result = asr_backend.transcribe(model, audio, compute_type=compute_type)
+        elapsed = time.perf_counter() - start
+
+        duration = len(audio) / generate_captions.WHISPER_SAMPLE_RATE
+        wer = word_error_rate(reference, result.text)
+        words = len(normalize(reference))
+        print(f"  {name}: WER {wer:.1%}, RTF {elapsed / duration:.3f}")
+
+        total_audio += duration
+        total_time += elapsed
+        total_errors += wer * words
+        total_words += words
+
+    return {
+        "load_time": load_time,
+        "wer": total_errors / max(1, total_words),
+        "rtf": total_time / max(total_audio, 1e-9),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("clips", help="Directory of audio clips with .txt references")
+    parser.add_argument("--model-size", default="base")
+    parser.add_argument(
+        "--backends", nargs="+", default=list(generate_captions.ASR_BACKENDS)
+    )
+    parser.add_argument(
+        "--compute-type",
+        default=None,
+        help="Compute type for every backend (defaults: torch fp32, ctranslate2 int8)",
+    )
+    args = parser.parse_args()
+
+    clips = load_clips(args.clips)
+    if not clips:
+        raise SystemExit(f"No clips with reference transcripts found in {args.clips}")
+
+    results = {}
+    for backend in args.backends:
+        print(f"\n{backend}:")
+        results[backend] = run_backend(
+            backend, clips, args.model_size, args.compute_type
+        )
+
+    print(f"\n{'backend':<12} {'load':>8} {'WER':>8} {'RTF':>8}")
+    for backend, result in results.items():
+        print(
+            f"{backend:<12} {result['load_time']:>7.2f}s "
+            f"{result['wer']:>8.1%} {result['rtf']:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Start-up time regression check for the web app.
+
+Imports `app` in a fresh interpreter and fails (exit code 1) when the import
+takes longer than the budget. Heavy subsystems (torch/TTS, moviepy, Whisper,
+genai) must stay behind lazy loaders for this to pass.
+
+Run from the project root:
+    python -m benchmarks.import_time --budget 1.0
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ["torch", "TTS", "moviepy", "stable_whisper", "google.generativeai"]
+
+PROBE = f"""
+import sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+loaded = [name for name in {HEAVY_MODULES!r} if name in sys.modules]
+print(elapsed)
+print(",".join(loaded))
+"""
+
+
+def measure(runs):
+    env = dict(os.environ)
+    env.setdefault("DB_URI", "sqlite://")
+    env.setdefault("SECRET_KEY", "benchmark")
+
+    timings = []
+    loaded = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE],
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+        if result.returncode != 0:
+            print(result.stderr)
+            raise SystemExit("Importing app failed")
+        lines = result.stdout.strip().splitlines()
+        timings.append(float(lines[-2]))
+        loaded = [name for name in lines[-1].split(",") if name]
+    return timings, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget", type=float, default=1.0, help="Seconds")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    timings, loaded = measure(args.runs)
+    best = min(timings)
+    print(f"import app: best {best:.3f}s over {args.runs} runs (budget {args.budget:.3f}s)")
+
+    failed = False
+    if loaded:
+        print(f"FAIL: heavy modules imported at start-up: {', '.join(loaded)}")
+        failed = True
+    if best > args.budget:
+        print("FAIL: start-up time is over budget")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark XTTS CPU mode (int8 dynamic quantization) against fp32.
+
+Reports the real-time factor (synthesis time / audio duration) of each mode and
+a simple quality check of the quantized output against fp32: duration and RMS
+energy deltas on a fixed sentence set. Both modes run with the thread pools
+pinned to TTS_NUM_THREADS / TTS_INTEROP_THREADS.
+
+Run from the project root:
+    python -m benchmarks.tts_cpu_benchmark --speaker 1 --language en
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import generate_audio
+
+SENTENCES = [
+    "It took me quite a long time to develop a voice and now that I have it I am not going to be silent.",
+    "The quick brown fox jumps over the lazy dog.",
+    "Every great story starts with a single idea that refuses to let go.",
+    "Scientists discovered that octopuses can taste the things they touch.",
+    "Stay until the end, because the last fact will surprise you.",
+]
+
+
+def rms_db(wav):
+    wav = np.asarray(wav, dtype=np.float32)
+    rms = np.sqrt(np.mean(np.square(wav))) if wav.size else 0.0
+    return 20 * np.log10(max(rms, 1e-9))
+
+
+def run_mode(cpu_mode, speaker_wav, language):
+    model = generate_audio.load_tts_model(cpu_mode=cpu_mode)
+
+    # Warm up so one-off allocations don't skew the first sentence
+    generate_audio.synthesize_chunk(
+        SENTENCES[0], model, generate_audio.get_tts_config(), speaker_wav, language
+    )
+
+    results = []
+    for sentence in SENTENCES:
+        start = time.perf_counter()
+        wav = generate_audio.synthesize_chunk(
+            sentence, model, generate_audio.get_tts_config(), speaker_wav, language
+        )
+        elapsed = time.perf_counter() - start
+        duration = len(wav) / generate_audio.SAMPLE_RATE
+        results.append(
+            {
+                "elapsed": elapsed,
+                "duration": duration,
+                "rtf": elapsed / duration if duration else float("inf"),
+                "energy_db": rms_db(wav),
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--speaker", default="1")
+    parser.add_argument("--language", default="en")
+    args = parser.parse_args()
+
+    speaker_wav = generate_audio.get_voice_sample(args.speaker, args.language)
+
+    # Both modes run on the same thread pools, so only quantization differs
+    generate_audio.configure_cpu_threads()
+
+    print("Running fp32 baseline...")
+    fp32 = run_mode(False, speaker_wav, args.language)
+    print("Running CPU mode (int8)...")
+    int8 = run_mode(True, speaker_wav, args.language)
+
+    print(
+        f"\n{'#':>2} {'fp32 RTF':>9} {'int8 RTF':>9} {'dur delta':>10} {'energy delta':>13}"
+    )
+    for i, (base, quant) in enumerate(zip(fp32, int8), 1):
+        duration_delta = (quant["duration"] - base["duration"]) / base["duration"]
+        energy_delta = quant["energy_db"] - base["energy_db"]
+        print(
+            f"{i:>2} {base['rtf']:>9.3f} {quant['rtf']:>9.3f} "
+            f"{duration_delta:>+9.1%} {energy_delta:>+10.2f} dB"
+        )
+
+    fp32_rtf = sum(r["elapsed"] for r in fp32) / sum(r["duration"] for r in fp32)
+    int8_rtf = sum(r["elapsed"] for r in int8) / sum(r["duration"] for r in int8)
+    print(f"\nOverall RTF: fp32={fp32_rtf:.3f} int8={int8_rtf:.3f}")
+    print(f"Speedup: {fp32_rtf / int8_rtf:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,465 @@
+from app import app, db
+from models.models import Video, YouTubeShort
+from generate_captions import (
+    CAPTION_ASR_WORKERS,
+    asr_slots,
+    generate as generate_captions,
+    generate_from_timings,
+    get_whisper_model,
+    transcript_caption_segments,
+    slice_word_segments,
+    write_word_captions,
+    burn_subtitles_to_video,
+)
+from transcript_index import load_transcript_index
+from transcript_cache import get_source_transcript
+from source_media import get_source_media, get_youtube_video_id, source_media_key
+from media_cache import get_media_cache
+from video_creator import cleanup_temp_files, get_relative_video_path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+import json
+import os
+import threading
+import uuid
+
+# Transcription shares one Whisper model (see asr_slots), burning is CPU-bound
+# moviepy work
+CAPTION_BURN_WORKERS = int(os.getenv("CAPTION_BURN_WORKERS") or 2)
+MAX_CAPTION_JOBS = 50
+
+# Batch jobs by id, kept in memory like the other background jobs
+caption_jobs = {}
+caption_jobs_lock = threading.Lock()
+
+
+def get_highlight_color(settings):
+    """Resolve the highlight color from caption settings, or None"""
+    if not settings.get("enable_highlight"):
+        return None
+    if settings.get("highlight_type") == "custom":
+        return settings.get("custom_highlight_color")
+    return settings.get("highlight_color")
+
+
+def get_source_url(source):
+    """
+    URL to download a source from: a watch URL for YouTube, any other URL (e.g.
+    a local HTTP server) as it is.
+    """
+    video_id = get_youtube_video_id(source.url)
+    if video_id:
+        return f"https://www.youtube.com/watch?v={video_id}"
+    return source.url
+
+
+def load_source_word_segments(source_id, source_url, model_size="base"):
+    """Get the source's word-level transcript, transcribing it once if needed"""
+    try:
+        with get_media_cache().pinned(source_media_key(source_url)):
+            return get_source_transcript(
+                source_id,
+                lambda: get_source_media(source_id, source_url),
+                model_size=model_size,
+            )
+    except Exception as e:
+        print(f"Error transcribing source {source_id}: {str(e)}")
+        return []
+
+
+def write_video_captions(
+    video_path, srt_path, settings, timings=None, script_lines=None, language=None
+):
+    """
+    Write the SRT for a generated video, preferring the narration timings, then
+    aligning the known script, and only transcribing as a last resort.
+
+    language is the narration language saved with the script, used to align it.
+    """
+    max_words = settings.get("max_words", 1)
+    highlight_color = get_highlight_color(settings)
+    caption_source = settings.get("caption_source", "timings")
+    model_size = settings.get("model_size", "base")
+
+    if caption_source == "timings" and timings:
+        # The narration timing is known, no need to transcribe it again
+        generate_from_timings(
+            timings,
+            max_words_per_caption=max_words,
+            highlight_color=highlight_color,
+            caption_format="srt",
+            output_filename=srt_path,
+        )
+    elif caption_source in ("timings", "align") and script_lines:
+        # Align the known script to the narration instead of transcribing
+        with asr_slots:
+            generate_captions(
+                media_file=video_path,
+                max_words_per_caption=max_words,
+                highlight_color=highlight_color,
+                caption_format="srt",
+                output_filename=srt_path,
+                model_size=model_size,
+                text=" ".join(script_lines),
+                language=(
+                    (timings or {}).get("language")
+                    or language
+                    or settings.get("language")
+                    or "en"
+                ),
+            )
+    else:
+        with asr_slots:
+            generate_captions(
+                media_file=video_path,
+                max_words_per_caption=max_words,
+                highlight_color=highlight_color,
+                caption_format="srt",
+                output_filename=srt_path,
+                model_size=model_size,
+            )
+
+
+def get_short_word_segments(
+    settings,
+    transcript_index,
+    start_time,
+    end_time,
+    source_id,
+    source_url,
+    source_segments,
+):
+    """
+    Get a short's word-level segments from the stored transcript, then from a
+    single transcription of the whole source. Empty when neither has them.
+
+    source_segments is a dict shared by the caller so a source is only loaded
+    once per run.
+    """
+    segments = transcript_caption_segments(
+        transcript_index.snippets_between(start_time, end_time), start_time, end_time
+    )
+    if not segments:
+        if source_id not in source_segments:
+            source_segments[source_id] = load_source_word_segments(
+                source_id, source_url, settings.get("model_size", "base")
+            )
+        segments = slice_word_segments(
+            source_segments[source_id], start_time, end_time
+        )
+    return segments
+
+
+def write_short_captions(
+    media_file,
+    srt_path,
+    settings,
+    transcript_index,
+    start_time,
+    end_time,
+    source_id,
+    source_url,
+    source_segments,
+):
+    """
+    Write the SRT for a rendered short, transcribing the short itself when
+    neither the stored transcript nor the source transcription covers it.
+    """
+    max_words = settings.get("max_words", 1)
+    highlight_color = get_highlight_color(settings)
+
+    segments = get_short_word_segments(
+        settings,
+        transcript_index,
+        start_time,
+        end_time,
+        source_id,
+        source_url,
+        source_segments,
+    )
+    if segments:
+        write_word_captions(
+            segments,
+            srt_path,
+            max_words_per_caption=max_words,
+            highlight_color=highlight_color,
+            caption_format="srt",
+        )
+    else:
+        with asr_slots:
+            generate_captions(
+                media_file=media_file,
+                max_words_per_caption=max_words,
+                highlight_color=highlight_color,
+                caption_format="srt",
+                output_filename=srt_path,
+                model_size=settings.get("model_size", "base"),
+            )
+
+
+def prepare_video_item(video_id):
+    """Read everything a worker needs to caption a video, so workers stay off the DB"""
+    video = Video.query.get(video_id)
+    if not video:
+        raise Exception("Video not found")
+    if not video.video_path:
+        raise Exception("Video has not been created yet")
+
+    video_path = os.path.join(
+        app.config["OUTPUT_FOLDER"], os.path.basename(video.video_path)
+    )
+    if not os.path.exists(video_path):
+        raise Exception("Video file not found")
+
+    return {
+        "media_file": video_path,
+        "srt_path": os.path.join(app.config["OUTPUT_FOLDER"], f"video_{video.id}.srt"),
+        "output_path": os.path.join(
+            app.config["OUTPUT_FOLDER"], f"video_{video.id}_with_subs.mp4"
+        ),
+        "timings": (
+            json.loads(video.script.timings)
+            if video.script and video.script.timings
+            else None
+        ),
+        "script_lines": (
+            json.loads(video.script.content).get("script", []) if video.script else []
+        ),
+        "language": video.script.language if video.script else None,
+    }
+
+
+def prepare_short_item(short_id, transcripts_by_source):
+    """Collect what a worker needs to caption a rendered short"""
+    short = YouTubeShort.query.get(short_id)
+    if not short:
+        raise Exception("Short not found")
+    if short.status != "completed" or not short.output_file:
+        raise Exception("Short has not been generated yet")
+    if "_with_subs" in short.output_file:
+        raise Exception("Short already has captions")
+
+    media_file = os.path.join(app.config["OUTPUT_FOLDER"], short.output_file)
+    if not os.path.exists(media_file):
+        raise Exception("Short file not found")
+
+    source = short.youtube_source
+    if source.id not in transcripts_by_source:
+        transcripts_by_source[source.id] = load_transcript_index(source)
+    video_id = get_youtube_video_id(source.url) or str(source.id)
+
+    return {
+        "media_file": media_file,
+        "srt_path": os.path.join(app.config["OUTPUT_FOLDER"], f"short_{short.id}.srt"),
+        "output_path": os.path.join(
+            app.config["OUTPUT_FOLDER"], f"short_{short.id}_{video_id}_with_subs.mp4"
+        ),
+        "transcript_index": transcripts_by_source[source.id],
+        "start_time": short.start_time,
+        "end_time": short.end_time,
+        "source_id": source.id,
+        "source_url": get_source_url(source),
+    }
+
+
+def transcribe_item(kind, item, settings, source_segments):
+    if kind == "video":
+        write_video_captions(
+            item["media_file"],
+            item["srt_path"],
+            settings,
+            timings=item["timings"],
+            script_lines=item["script_lines"],
+            language=item["language"],
+        )
+    else:
+        write_short_captions(
+            item["media_file"],
+            item["srt_path"],
+            settings,
+            item["transcript_index"],
+            item["start_time"],
+            item["end_time"],
+            item["source_id"],
+            item["source_url"],
+            source_segments,
+        )
+
+
+def burn_item(item, settings):
+    burn_subtitles_to_video(
+        video_path=item["media_file"],
+        srt_path=item["srt_path"],
+        output_path=item["output_path"],
+        font_size=settings.get("font_size", 40),
+        position=settings.get("position", "bottom"),
+    )
+    if not os.path.exists(item["output_path"]):
+        raise Exception("Burning captions produced no output")
+
+
+def finish_item(kind, item_id, item):
+    """Record a captioned item in the database"""
+    if kind == "video":
+        video = Video.query.get(item_id)
+        video.status = "completed"
+        video.error_message = None
+        video.video_with_subs_path = get_relative_video_path(video.id, with_subs=True)
+        db.session.commit()
+        cleanup_temp_files(video, keep_final=True)
+    else:
+        short = YouTubeShort.query.get(item_id)
+        short.output_file = os.path.basename(item["output_path"])
+        db.session.commit()
+        try:
+            os.remove(item["media_file"])
+        except Exception as e:
+            print(f"Error removing original file: {str(e)}")
+
+
+def update_job_item(job, key, status, error=None):
+    with caption_jobs_lock:
+        job["items"][key]["status"] = status
+        job["items"][key]["error"] = error
+        job["updated_at"] = datetime.utcnow().isoformat()
+
+
+def run_caption_batch(job_id):
+    """Caption every item of a batch job: transcribe in one pool, burn in another"""
+    job = caption_jobs[job_id]
+    settings = job["settings"]
+    error = None
+
+    try:
+        with app.app_context():
+            prepared = {}
+            transcripts_by_source = {}
+            for key, entry in job["items"].items():
+                try:
+                    if entry["kind"] == "video":
+                        prepared[key] = prepare_video_item(entry["id"])
+                    else:
+                        prepared[key] = prepare_short_item(
+                            entry["id"], transcripts_by_source
+                        )
+                except Exception as e:
+                    update_job_item(job, key, "failed", str(e))
+
+            needs_asr = settings.get("caption_source") != "timings" or any(
+                job["items"][key]["kind"] == "short" for key in prepared
+            )
+            if needs_asr:
+                try:
+                    # Load the model once up front instead of inside the first worker
+                    get_whisper_model(settings.get("model_size", "base"))
+                except Exception as e:
+                    print(
+                        f"Error loading Whisper model for caption batch {job_id}: "
+                        f"{str(e)}"
+                    )
+
+            source_segments = {}
+            asr_pool = ThreadPoolExecutor(max_workers=CAPTION_ASR_WORKERS)
+            burn_pool = ThreadPoolExecutor(max_workers=CAPTION_BURN_WORKERS)
+            pending = {}
+            try:
+                for key, item in prepared.items():
+                    kind = job["items"][key]["kind"]
+                    update_job_item(job, key, "transcribing")
+                    future = asr_pool.submit(
+                        transcribe_item, kind, item, settings, source_segments
+                    )
+                    pending[future] = ("transcribe", key)
+
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage, key = pending.pop(future)
+                        entry = job["items"][key]
+                        try:
+                            future.result()
+                            if stage == "transcribe":
+                                update_job_item(job, key, "burning")
+                                burn_future = burn_pool.submit(
+                                    burn_item, prepared[key], settings
+                                )
+                                pending[burn_future] = ("burn", key)
+                            else:
+                                finish_item(entry["kind"], entry["id"], prepared[key])
+                                update_job_item(job, key, "completed")
+                        except Exception as e:
+                            print(f"Error captioning {key}: {str(e)}")
+                            db.session.rollback()
+                            update_job_item(job, key, "failed", str(e))
+            finally:
+                asr_pool.shutdown(wait=True)
+                burn_pool.shutdown(wait=True)
+    except Exception as e:
+        print(f"Error running caption batch {job_id}: {str(e)}")
+        error = str(e)
+    finally:
+        # Always settle the job, so its status never stays "running"
+        with caption_jobs_lock:
+            for entry in job["items"].values():
+                if entry["status"] not in ("completed", "failed"):
+                    entry["status"] = "failed"
+                    entry["error"] = error or "Batch stopped before this item finished"
+            job["status"] = "failed" if error else "completed"
+            job["updated_at"] = datetime.utcnow().isoformat()
+
+
+def start_caption_batch(video_ids, short_ids, settings):
+    """Start a background captioning job and return its id"""
+    job_id = uuid.uuid4().hex
+    items = {}
+    for kind, ids in (("video", video_ids), ("short", short_ids)):
+        for item_id in ids:
+            items[f"{kind}:{item_id}"] = {
+                "kind": kind,
+                "id": item_id,
+                "status": "queued",
+                "error": None,
+            }
+
+    now = datetime.utcnow().isoformat()
+    with caption_jobs_lock:
+        # Forget the oldest finished jobs
+        finished = [
+            k
+            for k, j in caption_jobs.items()
+            if j["status"] in ("completed", "failed")
+        ]
+        for old_id in finished[: max(0, len(caption_jobs) - MAX_CAPTION_JOBS + 1)]:
+            del caption_jobs[old_id]
+        caption_jobs[job_id] = {
+            "id": job_id,
+            "status": "running",
+            "settings": settings,
+            "items": items,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    thread = threading.Thread(target=run_caption_batch, args=(job_id,))
+    thread.daemon = True
+    thread.start()
+    return job_id
+
+
+def get_caption_job(job_id):
+    """Get a snapshot of a batch job's status, or None if it doesn't exist"""
+    with caption_jobs_lock:
+        job = caption_jobs.get(job_id)
+        if job is None:
+            return None
+        items = list(job["items"].values())
+        return {
+            "id": job["id"],
+            "status": job["status"],
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"],
+            "total": len(items),
+            "completed": len([i for i in items if i["status"] == "completed"]),
+            "failed": len([i for i in items if i["status"] == "failed"]),
+            "items": [dict(item) for item in items],
+        }
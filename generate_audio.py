@@ -1,20 +1,83 @@
-from TTS.utils.synthesizer import save_wav
-import torch
 import numpy as np
 import os
 import uuid
 import wave
-import json
-from TTS.tts.configs.xtts_config import XttsConfig
-from TTS.tts.models.xtts import Xtts
 import re
-from pydub import AudioSegment
+from voice_registry import voice_registry
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# torch and TTS are imported on first use so importing this module stays cheap
+device = None
+tts_config = None
 tts_model = None
 
-config = XttsConfig()
-config.load_json("./resources/tts/xtts_v2/config.json")
+SAMPLE_RATE = 22050
+
+# Opt-in CPU inference tuning (int8 dynamic quantization + pinned thread pools)
+CPU_MODE = os.getenv("TTS_CPU_MODE", "").lower() in ("1", "true", "yes")
+CPU_NUM_THREADS = int(os.getenv("TTS_NUM_THREADS") or 0) or os.cpu_count() or 1
+CPU_INTEROP_THREADS = int(os.getenv("TTS_INTEROP_THREADS") or 1)
+
+
+def get_device():
+    global device
+    if device is None:
+        import torch
+
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    return device
+
+
+def get_tts_config():
+    global tts_config
+    if tts_config is None:
+        from TTS.tts.configs.xtts_config import XttsConfig
+
+        config = XttsConfig()
+        config.load_json("./resources/tts/xtts_v2/config.json")
+        tts_config = config
+    return tts_config
+
+
+def configure_cpu_threads(num_threads=None, interop_threads=None):
+    """Pin the intra-op and inter-op thread pools for this worker process"""
+    import torch
+
+    num_threads = num_threads or CPU_NUM_THREADS
+    interop_threads = interop_threads or CPU_INTEROP_THREADS
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError:
+        # The inter-op pool can only be sized once, before any parallel work
+        print("Warning: inter-op threads already initialized, keeping current size")
+    print(
+        f"TTS CPU threads: intra-op={torch.get_num_threads()}, "
+        f"inter-op={torch.get_num_interop_threads()}"
+    )
+
+
+def quantize_for_cpu(model):
+    """Apply dynamic int8 quantization to the model's Linear layers"""
+    import torch
+
+    return torch.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+
+
+def load_tts_model(cpu_mode=False):
+    """Load a fresh XTTS model, optionally tuned for CPU inference"""
+    from TTS.tts.models.xtts import Xtts
+
+    config = get_tts_config()
+    model = Xtts.init_from_config(config)
+    model.load_checkpoint(config, checkpoint_dir="./resources/tts/xtts_v2/", eval=True)
+    # model.cuda()
+    if cpu_mode:
+        configure_cpu_threads()
+        model = quantize_for_cpu(model)
+        print("TTS running in CPU mode (int8 dynamic quantization)")
+    return model
 
 
 def get_tts_model():
@@ -22,12 +85,7 @@ def get_tts_model():
     if tts_model is None:
         try:
             print("Initializing TTS...")
-            model = Xtts.init_from_config(config)
-            model.load_checkpoint(
-                config, checkpoint_dir="./resources/tts/xtts_v2/", eval=True
-            )
-            # model.cuda()
-            tts_model = model
+            tts_model = load_tts_model(cpu_mode=CPU_MODE and get_device().type == "cpu")
         except Exception as e:
             print(f"Error initializing TTS model: {e}")
             return None
@@ -36,48 +94,12 @@ def get_tts_model():
 
 def load_voice_overs():
     """Load voice overs from the voice_overs.json file"""
-    try:
-        with open("voice_overs.json", "r") as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error loading voice overs: {e}")
-        return {}
+    return voice_registry.voice_overs()
 
 
 def get_voice_sample(voice_id, language="en"):
     """Get the voice sample path for a given voice ID and language"""
-    voice_overs = load_voice_overs()
-    default_sample = "./resources/audio.wav"
-
-    # First check if the file exists in the voice_overs data
-    if language in voice_overs:
-        for voice in voice_overs[language]["voices"]:
-            if voice["id"] == voice_id:
-                sample_path = voice.get("sample", default_sample)
-                if os.path.exists(sample_path):
-                    return sample_path
-                else:
-                    print(
-                        f"Warning: Sample file {sample_path} not found, using default"
-                    )
-
-    # If we reach here, either the voice wasn't found or the sample doesn't exist
-    # Check if the default sample exists
-    if os.path.exists(default_sample):
-        return default_sample
-
-    # If even the default doesn't exist, use the first available sample file in resources
-    resources_dir = "./resources"
-    if os.path.exists(resources_dir):
-        for root, _, files in os.walk(resources_dir):
-            for file in files:
-                if file.endswith((".wav", ".mp3")):
-                    return os.path.join(root, file)
-
-    # If we still can't find anything, raise a more helpful error
-    raise FileNotFoundError(
-        f"No voice sample files found. Please ensure voice sample files exist in {resources_dir} or the path specified in voice_overs.json"
-    )
+    return voice_registry.get_sample(voice_id, language)
 
 
 def split_text_into_chunks(text, max_tokens):
@@ -93,12 +115,15 @@ def split_text_into_chunks(text, max_tokens):
 
 def synthesize_chunk(text, model, config, speaker_wav, language):
     """Synthesize a single chunk of text"""
-    outputs = model.synthesize(
-        text,
-        config,
-        speaker_wav=speaker_wav,
-        language=language,
-    )
+    import torch
+
+    with torch.inference_mode():
+        outputs = model.synthesize(
+            text,
+            config,
+            speaker_wav=speaker_wav,
+            language=language,
+        )
 
     if isinstance(outputs, dict):
         if "wav" in outputs:
@@ -116,7 +141,190 @@ def synthesize_chunk(text, model, config, speaker_wav, language):
         return outputs
 
 
-def text_to_speech(text, output_dir="output_audio", speaker="1", language="en"):
+def wav_to_pcm16(wav):
+    """Normalize a float waveform to 16-bit PCM bytes (same scaling as save_wav)"""
+    wav = np.asarray(wav, dtype=np.float32)
+    wav_norm = wav * (32767 / max(0.01, np.max(np.abs(wav)) if wav.size else 0))
+    return wav_norm.astype(np.int16).tobytes()
+
+
+def split_lines_into_chunks(lines, max_tokens):
+    """Chunk each line separately so no chunk straddles two script lines"""
+    if isinstance(lines, str):
+        lines = [lines]
+    chunks = []
+    for line_index, line in enumerate(lines):
+        for chunk in split_text_into_chunks(line or "", max_tokens):
+            chunks.append((line_index, chunk))
+    return chunks
+
+
+def estimate_chunk_words(text, wav, offset):
+    """
+    Estimate the sample span of every word in a synthesized chunk.
+
+    Words share the chunk's voiced region (leading and trailing silence is
+    trimmed) in proportion to their length.
+    """
+    words = text.split()
+    level = np.abs(np.asarray(wav, dtype=np.float32))
+    voiced = np.flatnonzero(level > 0.02 * level.max()) if level.size else []
+    if len(voiced):
+        start, end = int(voiced[0]), int(voiced[-1]) + 1
+    else:
+        start, end = 0, len(level)
+
+    weights = [len(word) + 1 for word in words]
+    total_weight = sum(weights) or 1
+    spans = []
+    cursor = float(start)
+    for word, weight in zip(words, weights):
+        length = (end - start) * weight / total_weight
+        spans.append([offset + round(cursor), offset + round(cursor + length), word])
+        cursor += length
+    return spans
+
+
+def stream_text_to_speech(
+    text, output_path, speaker="1", language="en", max_tokens=15
+):
+    """
+    Synthesize text chunk by chunk, appending each chunk to output_path as soon
+    as it is produced. The file is a valid WAV after every chunk.
+
+    Args:
+        text: A string, or a list of script lines (chunks never span two lines)
+        output_path: Path of the WAV file to write progressively
+        speaker: Voice ID from voice_overs.json
+        language: Language code of the voice
+        max_tokens: Maximum number of words per synthesized chunk
+
+    Yields:
+        dict: index, total, line, text, offset (first sample of the chunk in
+        the output file), samples, words (estimated [start, end, word] sample
+        spans) and wav for every synthesized chunk
+    """
+    model = get_tts_model()
+    if model is None:
+        raise RuntimeError("TTS model failed to initialize")
+
+    config = get_tts_config()
+    speaker_wav = get_voice_sample(speaker, language)
+    text_chunks = split_lines_into_chunks(text, max_tokens)
+    print(f"Text split into {len(text_chunks)} chunks")
+
+    if len(text_chunks) == 0:
+        raise ValueError("No valid text chunks to process")
+
+    offset = 0
+    with open(output_path, "wb") as f, wave.open(f, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+
+        for i, (line_index, chunk) in enumerate(text_chunks):
+            print(f"Processing chunk {i+1}/{len(text_chunks)}")
+            wav = synthesize_chunk(chunk, model, config, speaker_wav, language)
+
+            # writeframes patches the header, flushing makes it visible to readers
+            wav_file.writeframes(wav_to_pcm16(wav))
+            f.flush()
+
+            samples = len(wav)
+            yield {
+                "index": i,
+                "line": line_index,
+                "text": chunk,
+                "total": len(text_chunks),
+                "offset": offset,
+                "samples": samples,
+                "words": estimate_chunk_words(chunk, wav, offset),
+                "wav": wav,
+            }
+            offset += samples
+
+
+def build_narration_timings(chunks, num_lines, language="en"):
+    """
+    Build the JSON-serializable timing record of a narration.
+
+    Offsets are in samples at sample_rate. "lines" holds the span of every
+    script line (None for lines that produced no audio) and "chunks" the span
+    and estimated word spans of every synthesized chunk.
+    """
+    lines = [None] * num_lines
+    chunk_timings = []
+    for chunk in chunks:
+        start = chunk["offset"]
+        end = chunk["offset"] + chunk["samples"]
+        if lines[chunk["line"]] is None:
+            lines[chunk["line"]] = {"start": start, "end": end}
+        else:
+            lines[chunk["line"]]["end"] = end
+        chunk_timings.append(
+            {
+                "line": chunk["line"],
+                "text": chunk["text"],
+                "start": start,
+                "end": end,
+                "words": chunk["words"],
+            }
+        )
+
+    return {
+        "sample_rate": SAMPLE_RATE,
+        "language": language,
+        "lines": lines,
+        "chunks": chunk_timings,
+    }
+
+
+def image_windows(timings, orders, fps=None):
+    """
+    Get the (start, end) window in seconds for images illustrating the given
+    script lines.
+
+    An image covers its own line and every following line without an image;
+    the first image also covers any lines before it. With fps, window edges
+    are snapped to frame boundaries so consecutive clips don't drift.
+    """
+    rate = float(timings["sample_rate"])
+    lines = timings["lines"]
+    total = timings["chunks"][-1]["end"] if timings["chunks"] else 0
+
+    def line_start(order):
+        # Start of the first line at or after order that has audio
+        for line in lines[order:]:
+            if line is not None:
+                return line["start"]
+        return total
+
+    def to_seconds(sample):
+        seconds = sample / rate
+        return round(seconds * fps) / fps if fps else seconds
+
+    orders = sorted(orders)
+    windows = {}
+    for i, order in enumerate(orders):
+        start = 0 if i == 0 else line_start(order)
+        end = line_start(orders[i + 1]) if i + 1 < len(orders) else total
+        windows[order] = (to_seconds(start), to_seconds(end))
+    return windows
+
+
+def synthesize_narration(text, output_dir="output_audio", speaker="1", language="en"):
+    """
+    Synthesize a narration and record its timing.
+
+    Args:
+        text: A string, or a list of script lines to time individually
+        output_dir: Directory for the generated WAV file
+        speaker: Voice ID from voice_overs.json
+        language: Language code of the voice
+
+    Returns:
+        tuple: (file_path, duration, timings), or (None, 0, None) on failure
+    """
     model = get_tts_model()
     if model is None:
         raise RuntimeError("TTS model failed to initialize")
@@ -127,69 +335,32 @@ def text_to_speech(text, output_dir="output_audio", speaker="1", language="en"):
         filename = f"{uuid.uuid4().hex}.wav"
         file_path = os.path.join(output_dir, filename)
 
-        # Get the voice sample path
-        speaker_wav = get_voice_sample(speaker, language)
-
-        print(f"Converting text to speech (length: {len(text)} chars)...")
+        lines = [text] if isinstance(text, str) else list(text)
+        print(f"Converting text to speech (length: {sum(map(len, lines))} chars)...")
         print(f"Using voice: {speaker}, language: {language}")
 
-        # Split text into manageable chunks
-        text_chunks = split_text_into_chunks(
-            text,
-            max_tokens=15,
-        )
-        print(f"Text split into {len(text_chunks)} chunks")
-
-        if len(text_chunks) == 0:
-            raise ValueError("No valid text chunks to process")
-
-        if len(text_chunks) == 1:
-            # If only one chunk, process normally
-            wav = synthesize_chunk(text_chunks[0], model, config, speaker_wav, language)
-            save_wav(wav=wav, path=file_path, sample_rate=22050)
-        else:
-            # Process each chunk and combine
-            temp_files = []
-
-            for i, chunk in enumerate(text_chunks):
-                print(f"Processing chunk {i+1}/{len(text_chunks)}")
-                temp_filename = os.path.join(output_dir, f"temp_{uuid.uuid4().hex}.wav")
-
-                wav = synthesize_chunk(chunk, model, config, speaker_wav, language)
-                save_wav(wav=wav, path=temp_filename, sample_rate=22050)
-                temp_files.append(temp_filename)
-
-            # Combine audio files using pydub
-            combined = AudioSegment.empty()
-            for temp_file in temp_files:
-                segment = AudioSegment.from_wav(temp_file)
-                combined += segment
-
-            # Export combined audio
-            combined.export(file_path, format="wav")
-
-            # Clean up temp files
-            for temp_file in temp_files:
-                try:
-                    os.remove(temp_file)
-                except:
-                    pass
+        chunks = []
+        for chunk in stream_text_to_speech(lines, file_path, speaker, language):
+            chunk.pop("wav")
+            chunks.append(chunk)
 
         print("Audio generation completed!")
 
-        # Calculate duration
-        with wave.open(file_path, "rb") as wav_file:
-            frames = wav_file.getnframes()
-            rate = wav_file.getframerate()
-            duration = frames / float(rate)
-
-        return file_path, duration
+        timings = build_narration_timings(chunks, len(lines), language)
+        total_samples = chunks[-1]["offset"] + chunks[-1]["samples"]
+        duration = total_samples / float(SAMPLE_RATE)
+        return file_path, duration, timings
     except Exception as e:
         print(f"Error generating audio: {e}")
         import traceback
 
         traceback.print_exc()
-        return None, 0
+        return None, 0, None
+
+
+def text_to_speech(text, output_dir="output_audio", speaker="1", language="en"):
+    file_path, duration, _ = synthesize_narration(text, output_dir, speaker, language)
+    return file_path, duration
 
 
 if __name__ == "__main__":
@@ -1,18 +1,734 @@
-import mimetypes
 from pathlib import Path
-from moviepy.editor import (
-    VideoFileClip,
-    AudioFileClip,
-    TextClip,
-    CompositeVideoClip,
-)
-import pysrt
+import bisect
 import os
 import re
+import subprocess
+import threading
+import time
+
+moviepy_configured = False
+
+# Whisper models stay loaded per (backend, model size, device, compute type) and
+# are dropped after sitting idle for WHISPER_IDLE_TIMEOUT seconds
+WHISPER_IDLE_TIMEOUT = int(os.getenv("WHISPER_IDLE_TIMEOUT") or 600)
+whisper_models = {}
+whisper_lock = threading.Lock()
+whisper_reaper = None
+
+# Transcriptions share the loaded models, so every caller (caption batches,
+# shorts, add_captions) takes one of these slots around its inference
+CAPTION_ASR_WORKERS = int(os.getenv("CAPTION_ASR_WORKERS") or 1)
+asr_slots = threading.BoundedSemaphore(CAPTION_ASR_WORKERS)
+
+WHISPER_SAMPLE_RATE = 16000
+
+# Voice activity detection before transcription, so long silent or quiet
+# intros aren't decoded (and can't be hallucinated over)
+WHISPER_VAD = (os.getenv("WHISPER_VAD") or "1").lower() in ("1", "true", "yes")
+VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB") or 12)
+VAD_MIN_ENERGY_DB = -55.0
+
+
+def load_moviepy():
+    """Import moviepy on first use and point it at ImageMagick once"""
+    global moviepy_configured
+    import moviepy.editor as editor
+
+    if not moviepy_configured:
+        import moviepy.config as cfg
+
+        cfg.change_settings({"IMAGEMAGICK_BINARY": "magick"})
+        moviepy_configured = True
+    return editor
+
+
+def load_audio(media_file, sample_rate=WHISPER_SAMPLE_RATE, start=None, duration=None):
+    """
+    Decode the first audio track of a media file into memory with one ffmpeg
+    call, as mono float32 PCM at sample_rate. The video stream is never decoded.
+
+    Args:
+        media_file: Path of the audio or video file
+        sample_rate: Output sample rate (Whisper expects 16 kHz)
+        start: Optional offset in seconds to start decoding from
+        duration: Optional number of seconds to decode
+
+    Returns:
+        numpy.ndarray: The waveform, scaled to [-1, 1]
+    """
+    import numpy as np
+
+    command = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error"]
+    if start:
+        command += ["-ss", str(start)]
+    if duration:
+        command += ["-t", str(duration)]
+    command += [
+        "-i",
+        str(media_file),
+        "-map",
+        "0:a:0",
+        "-vn",
+        "-sn",
+        "-dn",
+        "-f",
+        "s16le",
+        "-acodec",
+        "pcm_s16le",
+        "-ac",
+        "1",
+        "-ar",
+        str(sample_rate),
+        "-",
+    ]
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"Failed to decode audio from {media_file}: "
+            f"{result.stderr.decode(errors='ignore').strip()}"
+        )
+    return np.frombuffer(result.stdout, np.int16).astype(np.float32) / 32768.0
+
+
+def unload_idle_whisper_models():
+    """Background loop dropping models that haven't been used for a while"""
+    while True:
+        time.sleep(max(1, min(60, WHISPER_IDLE_TIMEOUT)))
+        now = time.monotonic()
+        with whisper_lock:
+            for key, entry in list(whisper_models.items()):
+                if now - entry["last_used"] > WHISPER_IDLE_TIMEOUT:
+                    print(f"Unloading idle Whisper model {key}")
+                    del whisper_models[key]
+
+
+class StableWhisperBackend:
+    """stable-ts on the reference PyTorch Whisper implementation"""
+
+    name = "torch"
+
+    def load(self, model_size, device=None, compute_type=None):
+        try:
+            import stable_whisper
+        except ImportError:
+            print("Dependencies to run Whisper locally are not installed,")
+            raise
+        return stable_whisper.load_model(model_size, device=device)
+
+    def _options(self, compute_type):
+        if compute_type:
+            return {"fp16": compute_type == "float16"}
+        return {}
+
+    def transcribe(self, model, audio, compute_type=None):
+        return model.transcribe(audio, **self._options(compute_type))
+
+    def align(self, model, audio, text, language=None, compute_type=None):
+        return model.align(audio, text, language=language, **self._options(compute_type))
+
+
+class FasterWhisperBackend:
+    """
+    stable-ts on faster-whisper (CTranslate2), int8 by default for CPU nodes.
+    Requires the faster-whisper package.
+    """
+
+    name = "ctranslate2"
+
+    def load(self, model_size, device=None, compute_type=None):
+        try:
+            import stable_whisper
+            import faster_whisper  # noqa: F401
+        except ImportError:
+            print("Dependencies to run faster-whisper locally are not installed,")
+            raise
+        return stable_whisper.load_faster_whisper(
+            model_size, device=device or "cpu", compute_type=compute_type or "int8"
+        )
+
+    def transcribe(self, model, audio, compute_type=None):
+        # Returns the same WhisperResult as the PyTorch backend
+        return model.transcribe_stable(audio, word_timestamps=True)
+
+    def align(self, model, audio, text, language=None, compute_type=None):
+        return model.align(audio, text, language=language)
+
+
+ASR_BACKENDS = {
+    StableWhisperBackend.name: StableWhisperBackend(),
+    FasterWhisperBackend.name: FasterWhisperBackend(),
+}
+DEFAULT_ASR_BACKEND = os.getenv("ASR_BACKEND") or StableWhisperBackend.name
+
+
+def get_asr_backend(backend=None):
+    name = backend or DEFAULT_ASR_BACKEND
+    if name not in ASR_BACKENDS:
+        raise ValueError(
+            f"Unknown ASR backend '{name}', expected one of {list(ASR_BACKENDS)}"
+        )
+    return ASR_BACKENDS[name]
+
+
+# Model sizes both backends know by name. Anything else would be loaded as a
+# local path or hub repo, and kept in the registry, so it's rejected up front
+WHISPER_MODEL_SIZES = (
+    "tiny",
+    "tiny.en",
+    "base",
+    "base.en",
+    "small",
+    "small.en",
+    "medium",
+    "medium.en",
+    "large-v1",
+    "large-v2",
+    "large-v3",
+)
+
+
+def check_model_size(model_size):
+    """Return model_size if it's a known Whisper size, raise ValueError otherwise"""
+    if model_size not in WHISPER_MODEL_SIZES:
+        raise ValueError(
+            f"Unknown Whisper model size '{model_size}', "
+            f"expected one of {list(WHISPER_MODEL_SIZES)}"
+        )
+    return model_size
+
+
+def get_whisper_model(model_size="base", device=None, compute_type=None, backend=None):
+    """
+    Get a process-wide Whisper model, loading it once per
+    (backend, model size, device, compute type).
+
+    Returns:
+        tuple: (model, load_time) where load_time is 0 when the model was warm
+    """
+    global whisper_reaper
+    check_model_size(model_size)
+    asr_backend = get_asr_backend(backend)
+    key = (asr_backend.name, model_size, device, compute_type)
+    with whisper_lock:
+        entry = whisper_models.get(key)
+        load_time = 0.0
+        if entry is None:
+            start = time.perf_counter()
+            model = asr_backend.load(model_size, device=device, compute_type=compute_type)
+            load_time = time.perf_counter() - start
+            print(f"Loaded Whisper model {key} in {load_time:.2f}s")
+
+            entry = {"model": model, "last_used": time.monotonic()}
+            whisper_models[key] = entry
+
+            if whisper_reaper is None and WHISPER_IDLE_TIMEOUT > 0:
+                whisper_reaper = threading.Thread(
+                    target=unload_idle_whisper_models, daemon=True
+                )
+                whisper_reaper.start()
+
+        entry["last_used"] = time.monotonic()
+        return entry["model"], load_time
+
+
+def touch_whisper_model(model_size="base", device=None, compute_type=None, backend=None):
+    """Mark a model as used so a long transcription doesn't count as idle time"""
+    key = (get_asr_backend(backend).name, model_size, device, compute_type)
+    with whisper_lock:
+        entry = whisper_models.get(key)
+        if entry is not None:
+            entry["last_used"] = time.monotonic()
+
+
+def get_color_tag(highlight_color):
+    """Get the (open, close) tag used to highlight the spoken word"""
+    if not highlight_color:
+        return None
+    if highlight_color == "bold":
+        return ("<b>", "</b>")
+    return (f'<span foreground="{highlight_color}">', "</span>")
+
+
+def format_timestamp(seconds, vtt=False):
+    milliseconds = max(0, round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    separator = "." if vtt else ","
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{milliseconds:03d}"
+
+
+def group_word_captions(segments, max_words_per_caption=1, highlight=False):
+    """
+    Split word-level segments into captions.
+
+    Returns:
+        list: (start, end, words, highlighted) tuples where highlighted is the
+            index of the spoken word, or None without highlighting
+    """
+    captions = []
+    for segment in segments:
+        if max_words_per_caption and max_words_per_caption > 0:
+            groups = [
+                segment[i : i + max_words_per_caption]
+                for i in range(0, len(segment), max_words_per_caption)
+            ]
+        else:
+            groups = [segment]
+
+        for group in groups:
+            if not group:
+                continue
+            words = [word.strip() for _, _, word in group]
+            if not highlight:
+                captions.append((group[0][0], group[-1][1], words, None))
+                continue
+            # One caption per word with the spoken word highlighted
+            for i, (start, end, _) in enumerate(group):
+                captions.append((start, end, words, i))
+    return captions
+
+
+def write_word_captions(
+    segments,
+    output_filename,
+    max_words_per_caption: int = 1,
+    highlight_color: str = None,
+    caption_format: str = "srt",
+):
+    """
+    Write SRT/VTT captions from word timings, in the same layout as
+    stable-whisper's to_srt_vtt.
+
+    Args:
+        segments: List of segments, each a list of (start, end, word) tuples
+        output_filename: Path of the caption file to write
+        max_words_per_caption: Split segments into captions of at most this many words
+        highlight_color: Highlight the spoken word with this color (or "bold")
+        caption_format: "srt" or "vtt"
+    """
+    vtt = caption_format == "vtt"
+    color_tag = get_color_tag(highlight_color)
+
+    captions = []
+    for start, end, words, highlighted in group_word_captions(
+        segments, max_words_per_caption, highlight=bool(color_tag)
+    ):
+        text = " ".join(
+            f"{color_tag[0]}{word}{color_tag[1]}" if j == highlighted else word
+            for j, word in enumerate(words)
+        )
+        captions.append((start, end, text))
+
+    with open(output_filename, "w", encoding="utf-8") as f:
+        if vtt:
+            f.write("WEBVTT\n\n")
+        for i, (start, end, text) in enumerate(captions, 1):
+            if not vtt:
+                f.write(f"{i}\n")
+            f.write(
+                f"{format_timestamp(start, vtt)} --> {format_timestamp(end, vtt)}\n"
+                f"{text}\n\n"
+            )
+
+    return output_filename
+
+
+ASS_COLORS = {
+    "white": "FFFFFF",
+    "black": "000000",
+    "yellow": "FFFF00",
+    "red": "FF0000",
+    "green": "00FF00",
+    "blue": "0000FF",
+    "orange": "FFA500",
+    "cyan": "00FFFF",
+    "magenta": "FF00FF",
+    "purple": "800080",
+    "pink": "FFC0CB",
+}
+
+# \an alignment per caption position
+ASS_ALIGNMENT = {"bottom": 2, "middle": 5, "top": 8}
+
+
+def ass_color(color, alpha=0):
+    """Convert a color name or #rgb/#rrggbb to ASS &HAABBGGRR"""
+    color = (color or "").strip().lower()
+    rgb = ASS_COLORS.get(color, color.lstrip("#")).lower()
+    if len(rgb) == 3:
+        rgb = "".join(c * 2 for c in rgb)
+    if not re.fullmatch(r"[0-9a-f]{6}", rgb):
+        rgb = ASS_COLORS["yellow"]
+    return f"&H{alpha:02X}{rgb[4:6]}{rgb[2:4]}{rgb[0:2]}".upper()
+
+
+def format_ass_timestamp(seconds):
+    centiseconds = max(0, round(seconds * 100))
+    hours, centiseconds = divmod(centiseconds, 360_000)
+    minutes, centiseconds = divmod(centiseconds, 6_000)
+    return f"{hours}:{minutes:02d}:{centiseconds // 100:02d}.{centiseconds % 100:02d}"
+
+
+def write_ass_captions(
+    segments,
+    output_filename,
+    max_words_per_caption: int = 1,
+    highlight_color: str = None,
+    font_size: int = 40,
+    position: str = "bottom",
+    width: int = 1080,
+    height: int = 1920,
+):
+    """
+    Write word-level captions as an ASS file for ffmpeg's subtitles filter,
+    styled like burn_subtitles_to_video: bold Arial, white text on a
+    semi-transparent black box, 20px from the edge.
+
+    Args:
+        segments: List of segments, each a list of (start, end, word) tuples
+        output_filename: Path of the ASS file to write
+        max_words_per_caption: Split segments into captions of at most this many words
+        highlight_color: Highlight the spoken word with this color (or "bold")
+        font_size: Font size in pixels of the rendered video
+        position: "bottom", "middle" or "top"
+        width, height: Size of the video the captions are burned into
+    """
+    if highlight_color == "bold":
+        open_tag, close_tag = r"{\b1}", r"{\b0}"
+    elif highlight_color:
+        open_tag, close_tag = rf"{{\c{ass_color(highlight_color)}}}", r"{\r}"
+    else:
+        open_tag = close_tag = ""
+
+    # #00000090 box in moviepy, ASS alpha counts transparency instead of opacity
+    box_color = ass_color("black", alpha=0xFF - 0x90)
+    alignment = ASS_ALIGNMENT.get(position, ASS_ALIGNMENT["bottom"])
+
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        "WrapStyle: 0",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, "
+        "OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, "
+        "ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, "
+        "MarginL, MarginR, MarginV, Encoding",
+        f"Style: Default,Arial,{font_size},{ass_color('white')},{ass_color('white')},"
+        f"{box_color},{box_color},-1,0,0,0,100,100,0,0,3,4,0,{alignment},20,20,20,1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+    for start, end, words, highlighted in group_word_captions(
+        segments, max_words_per_caption, highlight=bool(open_tag)
+    ):
+        words = [word.replace("{", "(").replace("}", ")") for word in words]
+        text = " ".join(
+            f"{open_tag}{word}{close_tag}" if j == highlighted else word
+            for j, word in enumerate(words)
+        )
+        lines.append(
+            f"Dialogue: 0,{format_ass_timestamp(start)},{format_ass_timestamp(end)},"
+            f"Default,,0,0,0,,{text}"
+        )
+
+    with open(output_filename, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+    return output_filename
+
+
+def generate_from_timings(
+    timings,
+    max_words_per_caption: int = 1,
+    highlight_color: str = None,
+    caption_format: str = "srt",
+    output_filename: str = None,
+):
+    """Write captions straight from narration timings, without transcription"""
+    rate = float(timings["sample_rate"])
+    segments = [
+        [(start / rate, end / rate, word) for start, end, word in chunk["words"]]
+        for chunk in timings["chunks"]
+    ]
+    return write_word_captions(
+        segments,
+        output_filename,
+        max_words_per_caption=max_words_per_caption,
+        highlight_color=highlight_color,
+        caption_format=caption_format,
+    )
 
-import moviepy.config as cfg
 
-cfg.change_settings({"IMAGEMAGICK_BINARY": "magick"})
+def transcript_caption_segments(
+    snippets, start_time, end_time, min_coverage=0.5, max_words_per_second=6.0
+):
+    """
+    Build caption segments for a clip from timestamped transcript snippets.
+
+    Snippets overlapping [start_time, end_time) are rebased to the clip's
+    timeline and their words are spread over each snippet's span in proportion
+    to word length.
+
+    Returns:
+        list: Segments of (start, end, word) tuples, or None when the transcript
+        doesn't cover the clip well enough to be trusted
+    """
+    clip_duration = end_time - start_time
+    if not snippets or clip_duration <= 0:
+        return None
+
+    segments = []
+    covered = 0.0
+    word_count = 0
+    for i, (start, duration, text) in enumerate(snippets):
+        # Auto-generated snippets overlap, cut each one at the next start
+        end = start + duration
+        if i + 1 < len(snippets):
+            end = min(end, max(start, snippets[i + 1][0]))
+        if end <= start_time or start >= end_time:
+            continue
+
+        # Drop sound annotations such as [Music] or [Applause]
+        words = [
+            word
+            for word in text.split()
+            if not (word.startswith("[") and word.endswith("]"))
+        ]
+        if not words:
+            continue
+
+        weights = [len(word) + 1 for word in words]
+        total_weight = sum(weights)
+        cursor = start
+        segment = []
+        for word, weight in zip(words, weights):
+            length = (end - start) * weight / total_weight
+            word_start, word_end = cursor, cursor + length
+            cursor = word_end
+            if start_time <= (word_start + word_end) / 2 < end_time:
+                segment.append(
+                    (
+                        max(0.0, word_start - start_time),
+                        min(clip_duration, word_end - start_time),
+                        word,
+                    )
+                )
+        if segment:
+            segments.append(segment)
+            word_count += len(segment)
+            covered += min(end, end_time) - max(start, start_time)
+
+    if not segments:
+        return None
+    if covered / clip_duration < min_coverage:
+        return None
+    if word_count / clip_duration > max_words_per_second:
+        return None
+    return segments
+
+
+def detect_speech_regions(
+    audio,
+    sample_rate=WHISPER_SAMPLE_RATE,
+    frame_seconds=0.03,
+    min_speech=0.25,
+    min_silence=0.5,
+    padding=0.2,
+):
+    """
+    Energy-based voice activity detection on a mono waveform.
+
+    Frames louder than the media's noise floor by VAD_THRESHOLD_DB count as
+    speech. Short pauses are bridged, blips are dropped and every region is
+    padded so word edges aren't clipped.
+
+    Returns:
+        list: (start, end) regions in seconds on the original timeline
+    """
+    import numpy as np
+
+    frame = int(sample_rate * frame_seconds)
+    num_frames = len(audio) // frame
+    if num_frames == 0:
+        return []
+
+    frames = audio[: num_frames * frame].reshape(num_frames, frame)
+    energy_db = 10 * np.log10(np.mean(np.square(frames), axis=1) + 1e-10)
+    noise_floor = np.percentile(energy_db, 10)
+    threshold = max(noise_floor + VAD_THRESHOLD_DB, VAD_MIN_ENERGY_DB)
+    is_speech = energy_db > threshold
+
+    # Runs of speech frames as [start, end) frame indices
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], is_speech.astype(np.int8), [0]))))
+    runs = edges.reshape(-1, 2) * frame_seconds
+
+    regions = []
+    for start, end in runs:
+        if regions and start - regions[-1][1] < min_silence:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+
+    total = len(audio) / sample_rate
+    padded = []
+    for start, end in regions:
+        if end - start < min_speech:
+            continue
+        start, end = max(0.0, start - padding), min(total, end + padding)
+        if padded and start <= padded[-1][1]:
+            padded[-1][1] = end
+        else:
+            padded.append([start, end])
+    return [(start, end) for start, end in padded]
+
+
+def compact_speech(audio, regions, sample_rate=WHISPER_SAMPLE_RATE, gap=0.3):
+    """
+    Concatenate speech regions into one shorter waveform, separated by short
+    silences, so Whisper decodes all of them in a single batched pass.
+
+    Returns:
+        tuple: (compact_audio, offsets) where offsets holds
+            (compact_start, original_start, original_end) per region
+    """
+    import numpy as np
+
+    silence = np.zeros(int(gap * sample_rate), dtype=audio.dtype)
+    pieces = []
+    offsets = []
+    position = 0.0
+    for start, end in regions:
+        piece = audio[int(start * sample_rate) : int(end * sample_rate)]
+        offsets.append((position, start, end))
+        pieces += [piece, silence]
+        position += (len(piece) + len(silence)) / sample_rate
+    return np.concatenate(pieces), offsets
+
+
+def restore_timeline(result, offsets):
+    """Map the timestamps of a result on compacted audio back to the original media"""
+    compact_starts = [offset[0] for offset in offsets]
+
+    def to_original(t):
+        index = max(0, bisect.bisect_right(compact_starts, t) - 1)
+        compact_start, start, end = offsets[index]
+        return min(end, start + (t - compact_start))
+
+    for segment in result.segments:
+        if segment.words:
+            for word in segment.words:
+                word.start = to_original(word.start)
+                word.end = max(word.start, to_original(word.end))
+        else:
+            segment.start = to_original(segment.start)
+            segment.end = max(segment.start, to_original(segment.end))
+    return result
+
+
+def run_whisper(
+    audio,
+    model_size="base",
+    device=None,
+    compute_type=None,
+    text=None,
+    language=None,
+    backend=None,
+    vad=None,
+):
+    """
+    Transcribe (or align text to) decoded audio with a registry model.
+
+    With VAD on (WHISPER_VAD, default), transcription skips silent and quiet
+    stretches: only detected speech regions are decoded and the timestamps are
+    mapped back onto the original timeline. Alignment always sees the full audio.
+    """
+    asr_backend = get_asr_backend(backend)
+    model, load_time = get_whisper_model(model_size, device, compute_type, backend)
+
+    offsets = None
+    if not text and (WHISPER_VAD if vad is None else vad):
+        regions = detect_speech_regions(audio)
+        total = len(audio) / WHISPER_SAMPLE_RATE
+        speech = sum(end - start for start, end in regions)
+        # Not worth remapping when there is (almost) nothing to skip
+        if regions and speech < total * 0.9:
+            print(
+                f"VAD: transcribing {speech:.1f}s of speech in {len(regions)} "
+                f"regions out of {total:.1f}s"
+            )
+            audio, offsets = compact_speech(audio, regions)
+
+    start = time.perf_counter()
+    if text:
+        result = asr_backend.align(
+            model, audio, text, language=language, compute_type=compute_type
+        )
+    else:
+        result = asr_backend.transcribe(model, audio, compute_type=compute_type)
+        if offsets:
+            result = restore_timeline(result, offsets)
+    inference_time = time.perf_counter() - start
+    touch_whisper_model(model_size, device, compute_type, backend)
+    print(
+        f"Whisper {model_size} ({asr_backend.name}) "
+        f"{'alignment' if text else 'transcription'}: "
+        f"load {load_time:.2f}s, inference {inference_time:.2f}s"
+    )
+    return result
+
+
+def result_to_word_segments(result):
+    """Convert a Whisper result to plain segments of (start, end, word) tuples"""
+    return [
+        [(word.start, word.end, word.word.strip()) for word in segment.words]
+        for segment in result.segments
+        if segment.words
+    ]
+
+
+def transcribe_word_segments(
+    media_file,
+    model_size="base",
+    device=None,
+    compute_type=None,
+    backend=None,
+    start=None,
+    duration=None,
+):
+    """
+    Transcribe a media file, or the [start, start + duration) range of it, into
+    word-level segments on the range's own timeline
+    """
+    audio = load_audio(media_file, start=start, duration=duration)
+    result = run_whisper(audio, model_size, device, compute_type, backend=backend)
+    return result_to_word_segments(result)
+
+
+def slice_word_segments(segments, start_time, end_time):
+    """
+    Cut word-level segments to [start_time, end_time) and rebase them onto the
+    clip's timeline. Words are kept when their midpoint falls in the window.
+    """
+    clip_duration = end_time - start_time
+    sliced = []
+    for segment in segments:
+        words = [
+            (
+                max(0.0, start - start_time),
+                min(clip_duration, end - start_time),
+                word,
+            )
+            for start, end, word in segment
+            if start_time <= (start + end) / 2 < end_time
+        ]
+        if words:
+            sliced.append(words)
+    return sliced
 
 
 def generate(
@@ -21,59 +737,46 @@ def generate(
     highlight_color: str = None,
     caption_format: str = "srt",
     output_filename: str = None,
+    model_size: str = "base",
+    device: str = None,
+    compute_type: str = None,
+    text: str = None,
+    language: str = None,
+    backend: str = None,
 ):
-    try:
-        import stable_whisper
-    except ImportError:
-        print("Dependencies to run Whisper locally are not installed,")
-        raise
+    """
+    Write word-level captions for a media file.
 
+    When the spoken text is already known (text), it is aligned to the audio
+    instead of transcribed, which is cheaper and can't introduce text errors.
+    """
     media_path = Path(media_file)
-    mime_type, _ = mimetypes.guess_type(str(media_path))
-    is_video = mime_type is not None and mime_type.startswith("video")
-
-    # If mimetypes didn't work, fall back to extension check
-    if mime_type is None:
-        video_extensions = [".mp4", ".avi", ".mov", ".mkv", ".webm", ".flv", ".wmv"]
-        is_video = media_path.suffix.lower() in video_extensions
 
     if not output_filename:
         output_filename = f"{media_path.stem}_captioned.mp4"
-        # Extract audio for transcription
-    audio_file = f"{media_path.stem}_audio.wav"
 
     try:
-        if is_video:
-            # Use MoviePy to extract audio
-            video_clip = VideoFileClip(str(media_path))
-            video_clip.audio.write_audiofile(str(audio_file), codec="pcm_s16le")
-            video_clip.close()
-        else:
-            # If it's already an audio file, create a copy or convert it to WAV
-            audio_clip = AudioFileClip(str(media_path))
-            audio_clip.write_audiofile(str(audio_file), codec="pcm_s16le")
-            audio_clip.close()
+        # Decode the audio track straight into memory, skipping the video stream
+        audio = load_audio(media_path)
     except Exception as e:
         print(f"Error processing media file: {e}")
         raise
 
-    model = stable_whisper.load_model("base")
-    result = model.transcribe(
-        str(audio_file),
+    result = run_whisper(
+        audio,
+        model_size,
+        device,
+        compute_type,
+        text=text,
+        language=language,
+        backend=backend,
     )
     if max_words_per_caption and max_words_per_caption > 0:
         result = result.split_by_length(max_words=max_words_per_caption)
     
     # Handle highlighting
-    highlight_words = False
-    color_tag = None
-    if highlight_color:
-        highlight_words = True
-        color = highlight_color
-        if color == "bold":
-            color_tag = ("<b>", "</b>")
-        else:
-            color_tag = (f'<span foreground="{color}">', "</span>")
+    highlight_words = bool(highlight_color)
+    color_tag = get_color_tag(highlight_color)
 
     result.to_srt_vtt(
         str(output_filename),
@@ -95,7 +798,10 @@ def burn_subtitles_to_video(
         filename, ext = os.path.splitext(video_path)
         output_path = f"{filename}_subbed{ext}"
 
-    video = VideoFileClip(video_path)
+    import pysrt
+
+    editor = load_moviepy()
+    video = editor.VideoFileClip(video_path)
     subs = pysrt.open(srt_path)
     subtitle_clips = []
 
@@ -142,7 +848,7 @@ def burn_subtitles_to_video(
         max_height = 0
 
         for text, color in segments:
-            clip = TextClip(
+            clip = editor.TextClip(
                 text,
                 fontsize=font_size,
                 color=color,
@@ -169,7 +875,7 @@ def burn_subtitles_to_video(
 
         subtitle_clips.extend(positioned_clips)
 
-    final_video = CompositeVideoClip([video] + subtitle_clips)
+    final_video = editor.CompositeVideoClip([video] + subtitle_clips)
     final_video.write_videofile(output_path, codec="libx264", audio_codec="aac")
 
     final_video.close()
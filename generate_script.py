@@ -1,18 +1,22 @@
 import os
-from google import genai
-from google.genai import types
 import json
 import re
+from llm_cache import cached_generate
 from prompts import (
     generate_niche_video_prompts,
 )
 from utils import extract_json_from_response
 
+SCRIPT_MODEL = "gemini-2.0-flash"
+SCRIPT_CONFIG = {"response_modalities": ["text"]}
+
 
 class GeminiVideoScriptGenerator:
     """Class to generate a video script"""
 
     def __init__(self, api_key=os.getenv("GEMINI_API_KEY")):
+        from google import genai
+
         self.client = genai.Client(api_key=api_key)
 
     def generate_video_script(
@@ -24,7 +28,12 @@ class GeminiVideoScriptGenerator:
         writing_style="direct",
         niche: str = None,
         main_idea: str = None,
+        force_fresh: bool = False,
     ) -> dict:
+        """
+        Generate a script, reusing a cached response for the same prompt
+        unless force_fresh is set.
+        """
 
         if not niche or not main_idea:
             raise ValueError("Niche and main_idea are required for niche video types")
@@ -38,17 +47,28 @@ class GeminiVideoScriptGenerator:
         )
         prompt = prompts[video_type]
 
+        from google.genai import types
+
         try:
             visual_prompt = f"make sure your visual are in this style {style} images"
             full_prompt = f"{prompt} {visual_prompt}"
-            
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=[{"text": full_prompt}],
-                config=types.GenerateContentConfig(response_modalities=["text"]),
-            )
 
-            raw_text = response.candidates[0].content.parts[0].text
+            def generate():
+                response = self.client.models.generate_content(
+                    model=SCRIPT_MODEL,
+                    contents=[{"text": full_prompt}],
+                    config=types.GenerateContentConfig(**SCRIPT_CONFIG),
+                )
+                return response.candidates[0].content.parts[0].text
+
+            raw_text = cached_generate(
+                SCRIPT_MODEL,
+                SCRIPT_CONFIG,
+                full_prompt,
+                generate,
+                force_fresh=force_fresh,
+                validate=lambda text: extract_json_from_response(text) is not None,
+            )
             return extract_json_from_response(raw_text)
         except Exception as e:
             print("Error generating video script:", str(e))
@@ -0,0 +1,193 @@
+from collections import deque
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# Keep-alive connections kept per host, and the most that may be open at once
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE") or 10)
+
+# Default (connect, read) timeouts in seconds
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT") or 5)
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT") or 120)
+
+# Retries after the first attempt, and the base and cap of the backoff in seconds
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES") or 3)
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF") or 0.5)
+HTTP_MAX_BACKOFF = 30.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Requests that are safe to send twice. Others, like the paid image POSTs, are
+# only retried when the server can't have acted on them
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+UNPROCESSED_STATUSES = {429, 503}
+
+# Latency samples kept per provider for the percentiles
+LATENCY_SAMPLES = 500
+
+sessions = {}
+latencies = {}
+lock = threading.Lock()
+
+
+def get_session(provider):
+    """
+    Get the shared session of a provider. Its connections are kept alive and
+    each host gets a pool of HTTP_POOL_SIZE that blocks when exhausted.
+    """
+    with lock:
+        session = sessions.get(provider)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=HTTP_POOL_SIZE,
+                pool_maxsize=HTTP_POOL_SIZE,
+                pool_block=True,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            sessions[provider] = session
+        return session
+
+
+def record_latency(provider, seconds):
+    with lock:
+        samples = latencies.setdefault(provider, deque(maxlen=LATENCY_SAMPLES))
+        samples.append(seconds)
+
+
+def latency_percentiles(provider):
+    """
+    Latency percentiles of a provider's recent requests, in seconds.
+
+    Returns:
+        dict: count, p50, p90 and p99, or None if nothing was recorded
+    """
+    with lock:
+        samples = sorted(latencies.get(provider, ()))
+    if not samples:
+        return None
+
+    def percentile(p):
+        return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))], 3)
+
+    return {
+        "count": len(samples),
+        "p50": percentile(50),
+        "p90": percentile(90),
+        "p99": percentile(99),
+    }
+
+
+def retry_after(response):
+    """Seconds to wait from a Retry-After header (delay or HTTP date), or None"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def never_sent(error):
+    """Whether a request failed before its connection was established"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def should_retry(method, response):
+    if method in IDEMPOTENT_METHODS:
+        return response.status_code in RETRY_STATUSES
+    # Retry-After on a success doesn't mean the request wasn't processed
+    return response.status_code in UNPROCESSED_STATUSES or (
+        response.status_code >= 400 and "Retry-After" in response.headers
+    )
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for a retry attempt (0-based)"""
+    return random.uniform(0, min(HTTP_MAX_BACKOFF, HTTP_BACKOFF * 2**attempt))
+
+
+def request(provider, method, url, retries=None, timeout=None, **kwargs):
+    """
+    Make a request through the provider's pooled session, retrying connection
+    errors, timeouts and 429/5xx responses with jittered exponential backoff.
+    A Retry-After header from the server takes precedence over the backoff;
+    one longer than HTTP_MAX_BACKOFF ends the retries.
+
+    Non-idempotent methods are only retried when the request never reached the
+    server (connect errors) or the server says it didn't process it (429, 503
+    or an error with a Retry-After header), so a read timeout or a successful
+    response never sends a POST twice.
+
+    Args:
+        provider: Name the session and latency stats are kept under
+        method: HTTP method
+        url: URL to request
+        retries: Retries after the first attempt (HTTP_RETRIES by default)
+        timeout: requests timeout, (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+            by default
+        **kwargs: Passed on to requests
+
+    Returns:
+        requests.Response: The last response, which may still be an error
+    """
+    session = get_session(provider)
+    retries = HTTP_RETRIES if retries is None else retries
+    timeout = timeout or (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+    for attempt in range(retries + 1):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= retries:
+                raise
+            if method.upper() not in IDEMPOTENT_METHODS and not never_sent(e):
+                raise
+            delay = backoff_delay(attempt)
+            print(f"{provider} request failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        record_latency(provider, time.perf_counter() - started)
+
+        if attempt >= retries or not should_retry(method.upper(), response):
+            return response
+
+        delay = retry_after(response)
+        if delay is None:
+            delay = backoff_delay(attempt)
+        elif delay > HTTP_MAX_BACKOFF:
+            print(
+                f"{provider} returned {response.status_code} with Retry-After "
+                f"{delay:.0f}s, over the {HTTP_MAX_BACKOFF:.0f}s limit, not retrying"
+            )
+            return response
+        print(
+            f"{provider} returned {response.status_code}, "
+            f"retrying in {delay:.1f}s ({attempt + 1}/{retries})"
+        )
+        response.close()
+        time.sleep(delay)
+
+
+def get(provider, url, **kwargs):
+    return request(provider, "GET", url, **kwargs)
+
+
+def post(provider, url, **kwargs):
+    return request(provider, "POST", url, **kwargs)
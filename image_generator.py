@@ -1,12 +1,24 @@
 import os
 import base64
-import requests
-from google import genai
-from google.genai import types
+import threading
+import http_client
 from PIL import Image
 from io import BytesIO
 from utils import use_placeholder_image
 
+IR_MODEL = "black-forest-labs/FLUX-1-schnell:free"
+GEMINI_IMAGE_MODEL = "gemini-2.0-flash-exp-image-generation"
+
+# Requests in flight per provider, shared by every job and route in the process
+PROVIDER_CONCURRENCY = {
+    "ir": int(os.getenv("IR_CONCURRENCY") or 4),
+    "gemini": int(os.getenv("GEMINI_IMAGE_CONCURRENCY") or 2),
+}
+provider_slots = {
+    provider: threading.BoundedSemaphore(limit)
+    for provider, limit in PROVIDER_CONCURRENCY.items()
+}
+
 
 class AIImageGenerator:
     """Class for generating images using Google's Gemini API or ImageRouter API"""
@@ -16,7 +28,11 @@ class AIImageGenerator:
     ):
         self.gemini_api_key = api_key
         self.ir_api_key = ir_api_key
-        self.client = genai.Client(api_key=api_key) if api_key else None
+        self.client = None
+        if api_key:
+            from google import genai
+
+            self.client = genai.Client(api_key=api_key)
 
     def download_image(
         self,
@@ -26,7 +42,7 @@ class AIImageGenerator:
         target_height=1920,
         image_style="realistic",
         use_ir=True,
-        ir_model="black-forest-labs/FLUX-1-schnell:free",
+        ir_model=IR_MODEL,
         ir_quality="medium",
     ):
         """
@@ -46,11 +62,13 @@ class AIImageGenerator:
             bool: True if image generation was successful, False otherwise
         """
         if use_ir:
-            return self._generate_with_ir(query, output_path, ir_model, ir_quality)
+            with provider_slots["ir"]:
+                return self._generate_with_ir(query, output_path, ir_model, ir_quality)
         else:
-            return self._generate_with_gemini(
-                query, output_path, target_width, target_height, image_style
-            )
+            with provider_slots["gemini"]:
+                return self._generate_with_gemini(
+                    query, output_path, target_width, target_height, image_style
+                )
 
     def _generate_with_gemini(
         self,
@@ -67,9 +85,11 @@ class AIImageGenerator:
             print("Gemini API key not set")
             return False
 
+        from google.genai import types
+
         try:
             response = self.client.models.generate_content(
-                model="gemini-2.0-flash-exp-image-generation",
+                model=GEMINI_IMAGE_MODEL,
                 contents=(
                     f"""generate an image with style of {image_style},
                     about ({query}) ,
@@ -125,7 +145,9 @@ class AIImageGenerator:
                 "Content-Type": "application/json",
             }
 
-            response = requests.post(url, json=payload, headers=headers)
+            response = http_client.post(
+                "imagerouter", url, json=payload, headers=headers
+            )
             response_data = response.json()
 
             if "data" not in response_data or not response_data["data"]:
@@ -138,7 +160,7 @@ class AIImageGenerator:
             # Handle both URL and base64 response formats
             if "url" in image_data and image_data["url"]:
                 # Download image from URL
-                img_response = requests.get(image_data["url"])
+                img_response = http_client.get("imagerouter_files", image_data["url"])
                 if img_response.status_code == 200:
                     image = Image.open(BytesIO(img_response.content))
                     image.save(output_path)
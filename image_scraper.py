@@ -1,5 +1,5 @@
 import os
-import requests
+import http_client
 import urllib.parse
 from bs4 import BeautifulSoup
 from PIL import Image
@@ -35,7 +35,9 @@ class ImageScraper:
                 f"https://www.bing.com/images/search?q={urllib.parse.quote(query)}"
                 f"&qft=+filterui:imagesize-custom_1080_1920&form=IRFLTR"
             )
-            response = requests.get(bing_url, headers=self.headers, timeout=10)
+            response = http_client.get(
+                "bing", bing_url, headers=self.headers, timeout=10, retries=1
+            )
 
             if response.status_code == 200:
                 soup = BeautifulSoup(response.content, "html.parser")
@@ -53,7 +55,9 @@ class ImageScraper:
                 f"?as_q={urllib.parse.quote(query)}"
                 f"&as_st=y&imgar=t%7Cxt&udm=2"
             )
-            response = requests.get(google_url, headers=self.headers, timeout=10)
+            response = http_client.get(
+                "google", google_url, headers=self.headers, timeout=10, retries=1
+            )
 
             if response.status_code == 200:
                 soup = BeautifulSoup(response.content, "html.parser")
@@ -81,8 +85,14 @@ class ImageScraper:
             image_urls = self.search_images(query)
             for url in image_urls:
                 try:
-                    response = requests.get(
-                        url, headers=self.headers, stream=True, timeout=5
+                    # Plenty of candidates, so a failing host isn't retried
+                    response = http_client.get(
+                        "image_hosts",
+                        url,
+                        headers=self.headers,
+                        stream=True,
+                        timeout=5,
+                        retries=0,
                     )
                     if response.status_code == 200:
                         # Check if content type is an image
@@ -90,6 +100,8 @@ class ImageScraper:
                             "image/"
                         ):
                             print("Skipping: Not an image content type")
+                            # Hand the connection back to the pool
+                            response.close()
                             continue
 
                         with open(output_path, "wb") as f:
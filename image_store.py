@@ -0,0 +1,164 @@
+from app import app
+from extensions import db
+from image_generator import AIImageGenerator, GEMINI_IMAGE_MODEL, IR_MODEL
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+# Unreferenced blobs younger than this are kept, since a job that just
+# generated or reused one may not have committed its Image row yet
+IMAGE_GC_GRACE_SECONDS = int(os.getenv("IMAGE_GC_GRACE_SECONDS") or 600)
+
+BLOB_PREFIX = "img_"
+
+# Blob keys share a fixed set of locks, so the locks don't grow with the store
+KEY_LOCK_STRIPES = 256
+key_locks = [threading.Lock() for _ in range(KEY_LOCK_STRIPES)]
+
+
+def image_key(provider, model, prompt, image_style, width, height, salt=None):
+    """Hash of everything that determines a generated image"""
+    payload = json.dumps(
+        [provider, model, prompt, image_style, width, height, salt],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def blob_relative_path(key):
+    """Path stored in Image.file_path for a blob"""
+    return f"output_images/{BLOB_PREFIX}{key}.png"
+
+
+def is_blob(relative_path):
+    return os.path.basename(relative_path or "").startswith(BLOB_PREFIX)
+
+
+def get_key_lock(key):
+    """Lock held while a blob is generated, so concurrent jobs make it once"""
+    return key_locks[int(key[:8], 16) % KEY_LOCK_STRIPES]
+
+
+def generate_image(
+    prompt,
+    image_style="realistic",
+    width=1080,
+    height=1920,
+    use_ir=True,
+    ir_model=IR_MODEL,
+    ir_quality="medium",
+    salt=None,
+):
+    """
+    Get the image for a prompt from the store, generating it on a miss.
+
+    Images are stored once per (provider, model, prompt, style, size) as
+    img_<hash>.png in OUTPUT_IMAGES, so the same prompt in another video is
+    free. Pass a new salt to get a different image instead of the stored one.
+
+    Returns:
+        str: Relative path for Image.file_path, or None if generation failed
+    """
+    if use_ir:
+        provider, model = "ir", [ir_model, ir_quality]
+    else:
+        provider, model = "gemini", GEMINI_IMAGE_MODEL
+    key = image_key(provider, model, prompt, image_style, width, height, salt)
+    relative_path = blob_relative_path(key)
+    path = os.path.join(app.config["OUTPUT_IMAGES"], os.path.basename(relative_path))
+
+    with get_key_lock(key):
+        if os.path.exists(path):
+            # Refresh the mtime so garbage collection gives the new row its grace
+            os.utime(path)
+            return relative_path
+
+        # Written next to the blob and moved in whole, so a blob is never partial
+        temp_path = f"{path[:-4]}_{uuid.uuid4().hex}.tmp.png"
+        try:
+            success = AIImageGenerator().download_image(
+                prompt,
+                temp_path,
+                target_width=width,
+                target_height=height,
+                image_style=image_style,
+                use_ir=use_ir,
+                ir_model=ir_model,
+                ir_quality=ir_quality,
+            )
+            if not success or not os.path.exists(temp_path):
+                return None
+            os.replace(temp_path, path)
+            return relative_path
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def new_salt():
+    """Salt for regenerating an image instead of reusing the stored one"""
+    return uuid.uuid4().hex
+
+
+def collect_unreferenced_images():
+    """
+    Remove blobs no Image row references anymore. The reference count is the
+    Image table itself, so shared images survive until their last video goes.
+    """
+    from models.models import Image
+
+    referenced = {
+        os.path.basename(file_path)
+        for (file_path,) in db.session.query(Image.file_path)
+        .filter(Image.file_path.isnot(None))
+        .distinct()
+    }
+    cutoff = time.time() - IMAGE_GC_GRACE_SECONDS
+    removed = 0
+    for path in glob.glob(
+        os.path.join(app.config["OUTPUT_IMAGES"], f"{BLOB_PREFIX}*.png")
+    ):
+        filename = os.path.basename(path)
+        if filename in referenced or filename.endswith(".tmp.png"):
+            continue
+        key = filename[len(BLOB_PREFIX) : -len(".png")]
+        with get_key_lock(key):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    if removed:
+        print(f"Removed {removed} unreferenced images")
+    return removed
+
+
+def release_images(relative_paths):
+    """
+    Release image files after their Image rows were deleted or cleared and
+    committed. Files from before the store belong to one video and are removed
+    directly, unless an Image row still points at them; blobs go through
+    garbage collection.
+    """
+    from models.models import Image
+
+    for relative_path in relative_paths:
+        if not relative_path or is_blob(relative_path):
+            continue
+        if Image.query.filter_by(file_path=relative_path).first():
+            continue
+        path = os.path.join(app.config["OUTPUT_IMAGES"], os.path.basename(relative_path))
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            print(f"Error removing image file: {str(e)}")
+    try:
+        collect_unreferenced_images()
+    except Exception as e:
+        print(f"Error collecting unreferenced images: {str(e)}")
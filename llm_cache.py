@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# How long a cached response is reused, in seconds (default 7 days)
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL") or 7 * 24 * 3600)
+
+# Total size of cached responses before least recently used ones are evicted
+LLM_CACHE_BYTES = int(os.getenv("LLM_CACHE_BYTES") or 64 * 1024**2)
+
+
+def cache_key(model_name, config, prompt):
+    """Hash of everything that determines a response: model, config and prompt"""
+    payload = json.dumps(
+        [model_name, config, prompt], sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    SQLite cache of LLM response texts.
+
+    Entries expire after a TTL, and when the stored text goes over the size
+    budget the least recently used entries are evicted. Each call opens its
+    own connection, so the cache can be shared by request and worker threads.
+    """
+
+    def __init__(self, path, ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self._ready:
+            with self._lock:
+                connection.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS responses (
+                        key TEXT PRIMARY KEY,
+                        model TEXT,
+                        response TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_access REAL NOT NULL
+                    )
+                    """
+                )
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS responses_last_access "
+                    "ON responses (last_access)"
+                )
+                connection.commit()
+                self._ready = True
+        return connection
+
+    def get(self, key):
+        """Get a cached response that hasn't expired, or None"""
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            if time.time() - created_at > self.ttl:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                connection.commit()
+                return None
+            connection.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            connection.commit()
+            return response
+        finally:
+            connection.close()
+
+    def put(self, key, response, model_name=None):
+        """Store a response, then evict to stay under the budget"""
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, model, response, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, response, len(response.encode("utf-8")), now, now),
+            )
+            connection.commit()
+            self.evict(connection)
+        finally:
+            connection.close()
+
+    def evict(self, connection):
+        """Drop expired entries, then least recently used ones over the budget"""
+        connection.execute(
+            "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,)
+        )
+        total = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        if total > self.max_bytes:
+            rows = connection.execute(
+                "SELECT key, size FROM responses ORDER BY last_access"
+            ).fetchall()
+            evicted = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                evicted.append((key,))
+                total -= size
+            connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+            print(f"Evicted {len(evicted)} responses from the LLM cache")
+        connection.commit()
+
+    def clear(self):
+        connection = self._connect()
+        try:
+            connection.execute("DELETE FROM responses")
+            connection.commit()
+        finally:
+            connection.close()
+
+
+llm_cache = None
+llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Get the process-wide LLM response cache in LLM_CACHE_PATH"""
+    global llm_cache
+    with llm_cache_lock:
+        if llm_cache is None:
+            from app import app
+
+            llm_cache = LLMCache(app.config["LLM_CACHE_PATH"])
+        return llm_cache
+
+
+def cached_generate(
+    model_name, config, prompt, generate, force_fresh=False, validate=None
+):
+    """
+    Get the response text for a prompt from the cache, or call generate() and
+    cache what it returns.
+
+    With validate, only responses it accepts are cached or reused, so a
+    malformed answer isn't replayed until it expires and a retry can fix it.
+
+    Args:
+        model_name: Name of the model, part of the cache key
+        config: JSON-serializable generation config, part of the cache key
+        prompt: Full prompt text, part of the cache key
+        generate: Function making the actual call and returning the text
+        force_fresh: Skip the cached response and replace it with a new one
+        validate: Function taking the response text and returning whether it
+            is usable, e.g. whether it parses
+
+    Returns:
+        str: The response text
+    """
+    cache = get_llm_cache()
+    key = cache_key(model_name, config, prompt)
+    if not force_fresh:
+        try:
+            response = cache.get(key)
+            if response is not None and (validate is None or validate(response)):
+                return response
+        except sqlite3.Error as e:
+            print(f"Error reading the LLM cache: {str(e)}")
+
+    response = generate()
+    if response and (validate is None or validate(response)):
+        try:
+            cache.put(key, response, model_name)
+        except sqlite3.Error as e:
+            print(f"Error writing the LLM cache: {str(e)}")
+    return response
@@ -0,0 +1,198 @@
+from contextlib import contextmanager
+from datetime import datetime
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+# Total size the cache may use before least recently used entries are evicted
+MEDIA_CACHE_BYTES = int(os.getenv("MEDIA_CACHE_BYTES") or 10 * 1024**3)
+
+PARTIAL_SUFFIXES = (".part", ".ytdl", ".tmp")
+
+
+class MediaCache:
+    """
+    Disk-budgeted cache for downloaded and derived media.
+
+    Files live in one folder under keys like "youtube:<video id>" and are
+    tracked in a small JSON index with their size and last access. When the
+    total size goes over the budget, the least recently used entries that
+    aren't pinned by a running job are evicted.
+    """
+
+    def __init__(self, root, max_bytes=MEDIA_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, "index.json")
+        self._lock = threading.RLock()
+        self._key_locks = {}
+        self._pins = {}
+        self._entries = None
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+        # Drop entries whose files were removed behind our back
+        self._entries = {
+            key: entry
+            for key, entry in entries.items()
+            if os.path.exists(os.path.join(self.root, entry["file"]))
+        }
+
+    def _save(self):
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(temp_path, self.index_path)
+
+    def _filename(self, key):
+        """File name stem for a key, readable but safe on every filesystem"""
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+        slug = re.sub(r"[^0-9A-Za-z_-]+", "_", key)[:60]
+        return f"{slug}_{digest}"
+
+    def key_lock(self, key):
+        """Lock held while an entry is being created, so it's only built once"""
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def path_template(self, key):
+        """Path without extension to write a new entry to, e.g. for yt-dlp's %(ext)s"""
+        os.makedirs(self.root, exist_ok=True)
+        return os.path.join(self.root, self._filename(key))
+
+    def find_written(self, key):
+        """Find a file written to path_template(key), whatever its extension"""
+        matches = [
+            path
+            for path in glob.glob(f"{self.path_template(key)}.*")
+            if not path.endswith(PARTIAL_SUFFIXES)
+        ]
+        return matches[0] if matches else None
+
+    def get(self, key):
+        """Get the path of a cached entry and mark it as used, or None"""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            path = os.path.join(self.root, entry["file"])
+            if not os.path.exists(path):
+                del self._entries[key]
+                self._save()
+                return None
+            entry["last_access"] = time.time()
+            self._save()
+            return path
+
+    def put(self, key, path):
+        """
+        Add a file to the cache under key, moving it into the cache folder if
+        needed, then evict to stay under the budget.
+
+        Returns:
+            str: The entry's path in the cache
+        """
+        with self._lock:
+            self._load()
+            if os.path.dirname(os.path.abspath(path)) != os.path.abspath(self.root):
+                ext = os.path.splitext(path)[1]
+                target = f"{self.path_template(key)}{ext}"
+                os.replace(path, target)
+                path = target
+
+            old = self._entries.get(key)
+            if old and old["file"] != os.path.basename(path):
+                self._remove_file(old["file"])
+
+            self._entries[key] = {
+                "file": os.path.basename(path),
+                "size": os.path.getsize(path),
+                "created_at": datetime.utcnow().isoformat(),
+                "last_access": time.time(),
+            }
+            self.evict(keep=key)
+            self._save()
+            return path
+
+    def _remove_file(self, filename):
+        try:
+            os.remove(os.path.join(self.root, filename))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error removing cached media {filename}: {e}")
+
+    def remove(self, key):
+        """Drop an entry unless a running job has it pinned"""
+        with self._lock:
+            self._load()
+            if self._pins.get(key):
+                return False
+            entry = self._entries.pop(key, None)
+            if entry:
+                self._remove_file(entry["file"])
+                self._save()
+            return True
+
+    def total_bytes(self):
+        with self._lock:
+            self._load()
+            return sum(entry["size"] for entry in self._entries.values())
+
+    def evict(self, keep=None):
+        """Remove least recently used, unpinned entries until under the budget"""
+        with self._lock:
+            self._load()
+            total = sum(entry["size"] for entry in self._entries.values())
+            for key, entry in sorted(
+                self._entries.items(), key=lambda item: item[1]["last_access"]
+            ):
+                if total <= self.max_bytes:
+                    break
+                if key == keep or self._pins.get(key):
+                    continue
+                print(f"Evicting {key} from the media cache ({entry['size']} bytes)")
+                self._remove_file(entry["file"])
+                del self._entries[key]
+                total -= entry["size"]
+            self._save()
+
+    @contextmanager
+    def pinned(self, key):
+        """Keep an entry (even one that doesn't exist yet) from being evicted"""
+        with self._lock:
+            self._pins[key] = self._pins.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pins[key] -= 1
+                if not self._pins[key]:
+                    del self._pins[key]
+
+
+media_cache = None
+media_cache_lock = threading.Lock()
+
+
+def get_media_cache():
+    """Get the process-wide media cache in MEDIA_CACHE_FOLDER"""
+    global media_cache
+    with media_cache_lock:
+        if media_cache is None:
+            from app import app
+
+            media_cache = MediaCache(app.config["MEDIA_CACHE_FOLDER"])
+        return media_cache
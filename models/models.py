@@ -16,7 +16,12 @@ class Video(db.Model):
     script = db.relationship(
         "Script", backref="video", uselist=False, cascade="all, delete-orphan"
     )
-    images = db.relationship("Image", backref="video", cascade="all, delete-orphan")
+    images = db.relationship(
+        "Image",
+        backref="video",
+        cascade="all, delete-orphan",
+        order_by="Image.order",
+    )
     image_style = db.Column(db.String(50), default="realistic")
     tone = db.Column(db.String(50), default="conversational")
     writing_style = db.Column(db.String(50), default="direct")
@@ -41,6 +46,8 @@ class Script(db.Model):
     content = db.Column(db.Text, nullable=False)
     audio_file = db.Column(db.String(255), nullable=True)
     audio_duration = db.Column(db.Float, default=0)
+    timings = db.Column(db.Text, nullable=True)  # Narration timing, stored as JSON string
+    language = db.Column(db.String(10), nullable=True)  # Narration language
 
 
 class Image(db.Model):
@@ -61,6 +68,8 @@ class YouTubeSource(db.Model):
     url = db.Column(db.String(255), nullable=False)
     title = db.Column(db.String(255))
     transcript = db.Column(db.Text)
+    # Snippet starts, durations and text offsets, see transcript_index.py
+    transcript_data = db.Column(db.LargeBinary, nullable=True)
     language = db.Column(db.String(10))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     videos = db.relationship("Video", backref="youtube_source", lazy=True)
@@ -2,7 +2,9 @@ from flask import render_template, request, redirect, url_for, flash
 from app import app
 from extensions import db
 from models.models import Video
-from generate_audio import text_to_speech
+from generate_audio import synthesize_narration, image_windows
+from video_creator import start_narrated_video_creation_background, VIDEO_FPS
+from voice_registry import voice_registry
 import json
 import os
 
@@ -15,8 +17,7 @@ def generate_audio(video_id):
         flash("No script found. Please generate a script first.", "error")
         return redirect(url_for("generate_script", video_id=video.id))
 
-    with open("voice_overs.json", "r", encoding="utf8") as f:
-        voice_overs = json.load(f)
+    voice_overs = voice_registry.voice_overs()
 
     script_data = json.loads(video.script.content)
 
@@ -32,14 +33,32 @@ def generate_audio(video_id):
                 except:
                     pass
 
-        script_text = " ".join(script_data.get("script", []))
+        script_lines = script_data.get("script", [])
 
         try:
             selected_speaker = request.form.get("speaker", "1")
             selected_language = request.form.get("language", "en")
 
-            audio_file, total_duration = text_to_speech(
-                script_text,
+            if request.form.get("render_video") == "on":
+                # Render image segments while the narration is synthesized
+                video.script.audio_file = None
+                video.script.timings = None
+                video.script.language = selected_language
+                video.error_message = None
+                video.status = "processing"
+                db.session.commit()
+                start_narrated_video_creation_background(
+                    video, speaker=selected_speaker, language=selected_language
+                )
+
+                flash(
+                    "Audio and video generation started in the background.",
+                    "success",
+                )
+                return redirect(url_for("video_status", video_id=video.id))
+
+            audio_file, total_duration, timings = synthesize_narration(
+                script_lines,
                 output_dir=app.config["OUTPUT_AUDIOS"],
                 speaker=selected_speaker,
                 language=selected_language,
@@ -52,12 +71,23 @@ def generate_audio(video_id):
             filename = os.path.basename(audio_file)
             video.script.audio_file = f"{filename}"
             video.script.audio_duration = total_duration
+            video.script.timings = json.dumps(timings)
+            video.script.language = selected_language
 
             num_images = len(video.images)
             if num_images > 0 and total_duration > 0:
-                duration_per_image = total_duration / num_images
-                for image in video.images:
-                    image.duration = duration_per_image
+                if all(image.order < len(script_lines) for image in video.images):
+                    # Each image lasts exactly as long as the lines it illustrates
+                    windows = image_windows(
+                        timings, [image.order for image in video.images], fps=VIDEO_FPS
+                    )
+                    for image in video.images:
+                        start, end = windows[image.order]
+                        image.duration = end - start
+                else:
+                    duration_per_image = total_duration / num_images
+                    for image in video.images:
+                        image.duration = duration_per_image
 
             video.status = "video_pending"
             db.session.commit()
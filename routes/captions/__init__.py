@@ -0,0 +1 @@
+from . import batch_routes
@@ -0,0 +1,78 @@
+from flask import request, jsonify, url_for
+from app import app
+from models.models import Video
+from captioner import start_caption_batch, get_caption_job
+from generate_captions import check_model_size
+
+
+def parse_ids(values):
+    ids = []
+    for value in values:
+        for part in str(value).split(","):
+            if part.strip().isdigit():
+                ids.append(int(part.strip()))
+    return ids
+
+
+@app.route("/captions/batch", methods=["POST"])
+def start_caption_batch_job():
+    """
+    Caption many videos and shorts in one background job.
+
+    Accepts video_ids / short_ids (lists or comma separated) and the same
+    caption settings as add_captions, as JSON or form data. With pending set,
+    every video in captions_pending is added to the batch.
+    """
+    data = request.get_json(silent=True)
+    if data is None:
+        data = request.form.to_dict()
+        data["video_ids"] = request.form.getlist("video_ids")
+        data["short_ids"] = request.form.getlist("short_ids")
+
+    video_ids = data.get("video_ids") or []
+    short_ids = data.get("short_ids") or []
+    video_ids = parse_ids(video_ids if isinstance(video_ids, list) else [video_ids])
+    short_ids = parse_ids(short_ids if isinstance(short_ids, list) else [short_ids])
+
+    if str(data.get("pending", "")).lower() in ("1", "true", "on", "yes"):
+        pending = Video.query.filter_by(status="captions_pending").all()
+        video_ids += [video.id for video in pending if video.id not in video_ids]
+
+    if not video_ids and not short_ids:
+        return jsonify({"success": False, "message": "No videos or shorts to caption"}), 400
+
+    enable_highlight = data.get("enable_highlight")
+    settings = {
+        "max_words": int(data.get("max_words", 1)),
+        "font_size": int(data.get("font_size", 40)),
+        "position": data.get("position", "bottom"),
+        "model_size": data.get("model_size", "base"),
+        "caption_source": data.get("caption_source", "timings"),
+        "language": data.get("language", "en"),
+        "enable_highlight": enable_highlight in (True, "on", "true", "1"),
+        "highlight_type": data.get("highlight_type"),
+        "highlight_color": data.get("highlight_color"),
+        "custom_highlight_color": data.get("custom_highlight_color"),
+    }
+
+    try:
+        check_model_size(settings["model_size"])
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    job_id = start_caption_batch(video_ids, short_ids, settings)
+    return jsonify(
+        {
+            "success": True,
+            "job_id": job_id,
+            "status_url": url_for("caption_batch_status", job_id=job_id),
+        }
+    )
+
+
+@app.route("/captions/batch/<job_id>")
+def caption_batch_status(job_id):
+    job = get_caption_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Job not found"}), 404
+    return jsonify(job)
@@ -1,11 +1,103 @@
-from flask import render_template, request, redirect, url_for, flash
+from flask import render_template, request, redirect, url_for, flash, jsonify
 from app import app
 from extensions import db
 from models.models import Video, Image
-from image_generator import AIImageGenerator
+from image_store import generate_image, release_images
+from http_client import latency_percentiles
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock, Thread
 import json
 import os
 
+# Image requests are network-bound; the per-provider limits in image_generator
+# decide how many actually run at once. Shared by every video's job
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS") or 8)
+images_pool = ThreadPoolExecutor(max_workers=IMAGE_WORKERS)
+
+# Videos with an image job running in this process. A video left in
+# images_processing by a restart isn't in here, so its images can be restarted
+image_jobs = set()
+image_jobs_lock = Lock()
+
+
+def process_generate_images(video_id, assets, old_paths=()):
+    """
+    Generate a video's images concurrently, adding each Image row as soon as
+    its image is done so process_images can show them while the rest run.
+
+    Args:
+        video_id: ID of the Video
+        assets: (order, prompt, animation_type, file_path) of each asset to
+            illustrate. Assets with a file_path keep that image
+        old_paths: file_path of the Image rows this job replaces
+    """
+    with app.app_context():
+        video = Video.query.get(video_id)
+        if not video:
+            with image_jobs_lock:
+                image_jobs.discard(video_id)
+            return
+
+        try:
+            done = 0
+            for order, prompt, animation_type, file_path in assets:
+                if file_path:
+                    db.session.add(
+                        Image(
+                            video_id=video.id,
+                            prompt=prompt,
+                            order=order,
+                            animation_type=animation_type,
+                            file_path=file_path,
+                        )
+                    )
+                    done += 1
+            video.progress = int(done / max(1, len(assets)) * 100)
+            db.session.commit()
+
+            futures = {
+                images_pool.submit(
+                    generate_image, prompt, image_style=video.image_style
+                ): (order, prompt, animation_type)
+                for order, prompt, animation_type, file_path in assets
+                if not file_path
+            }
+            for future in as_completed(futures):
+                order, prompt, animation_type = futures[future]
+                try:
+                    file_path = future.result()
+                except Exception as e:
+                    print(f"Error generating image {order + 1}: {str(e)}")
+                    file_path = None
+
+                db.session.add(
+                    Image(
+                        video_id=video.id,
+                        prompt=prompt,
+                        order=order,
+                        animation_type=animation_type,
+                        file_path=file_path,
+                    )
+                )
+                done += 1
+                video.progress = int(done / len(assets) * 100)
+                db.session.commit()
+
+            video.status = "audio_pending"
+            db.session.commit()
+            print(f"ImageRouter latency: {latency_percentiles('imagerouter')}")
+        except Exception as e:
+            print(f"Error generating images: {str(e)}")
+            # Images that finished are kept, missing ones can be generated one by one
+            db.session.rollback()
+            video.status = "audio_pending"
+            db.session.commit()
+        finally:
+            # Only now, so images the new rows reuse are still referenced
+            release_images(old_paths)
+            with image_jobs_lock:
+                image_jobs.discard(video_id)
+
 
 # Step 2: Image Generation
 @app.route("/video/<int:video_id>/generate_images", methods=["GET", "POST"])
@@ -19,50 +111,66 @@ def generate_images(video_id):
     script_data = json.loads(video.script.content)
 
     if request.method == "POST":
-        # Clear existing images
-        for image in video.images:
-            if image.file_path and os.path.exists(image.file_path):
-                try:
-                    os.remove(image.file_path)
-                except:
-                    pass
-
-        Image.query.filter_by(video_id=video.id).delete()
-        # Generate new images
-        image_generator = AIImageGenerator()
-
-        for i, asset_description in enumerate(script_data.get("assets", [])):
-            if not asset_description or not asset_description.strip():
-                continue
-            image_file = os.path.join(
-                app.config["OUTPUT_IMAGES"], f"video_{video.id}_image_{i+1}.png"
-            )
-
-            # Generate image
-            success = image_generator.download_image(
-                asset_description,
-                image_file,
-                image_style=video.image_style,
-                use_ir=True,
-            )
-
-            # Get animation type from form
-            animation_type = request.form.get(f"animation_{i}", "fade")
-
-            # Create image record - store relative path for database
-            relative_path = f"output_images/video_{video.id}_image_{i+1}.png"
-            image = Image(
-                video_id=video.id,
-                prompt=asset_description,
-                order=i,
-                animation_type=animation_type,
-                file_path=relative_path if success else None,
+        with image_jobs_lock:
+            if video.id in image_jobs:
+                flash("Images are already being generated for this video.", "error")
+                return redirect(url_for("process_images", video_id=video.id))
+            image_jobs.add(video.id)
+
+        try:
+            # Images whose prompt is unchanged are kept, including ones replaced
+            # with Regenerate, which the prompt alone wouldn't bring back
+            kept_paths = {}
+            for image in video.images:
+                if not image.file_path:
+                    continue
+                path = os.path.join(
+                    app.config["OUTPUT_IMAGES"], os.path.basename(image.file_path)
+                )
+                if os.path.exists(path):
+                    # Refresh the mtime so garbage collection keeps it until the
+                    # job adds its new row
+                    os.utime(path)
+                    kept_paths[image.prompt] = image.file_path
+
+            assets = [
+                (
+                    i,
+                    asset_description,
+                    request.form.get(f"animation_{i}", "fade"),
+                    kept_paths.get(asset_description),
+                )
+                for i, asset_description in enumerate(script_data.get("assets", []))
+                if asset_description and asset_description.strip()
+            ]
+
+            # Clear existing images, files go once no other video uses them.
+            # Files the new rows keep aren't released
+            kept = {file_path for _, _, _, file_path in assets if file_path}
+            old_paths = [
+                image.file_path
+                for image in video.images
+                if image.file_path not in kept
+            ]
+            Image.query.filter_by(video_id=video.id).delete()
+
+            video.status = "images_processing"
+            video.progress = 0
+            db.session.commit()
+
+            # Start background processing
+            thread = Thread(
+                target=process_generate_images, args=(video.id, assets, old_paths)
             )
-            db.session.add(image)
-
-        # Update video status
-        video.status = "audio_pending"
-        db.session.commit()
+            thread.daemon = True
+            thread.start()
+        except Exception as e:
+            # Nothing is running for the video, so don't leave it marked busy
+            db.session.rollback()
+            with image_jobs_lock:
+                image_jobs.discard(video_id)
+            flash(f"Error starting image generation: {str(e)}", "error")
+            return redirect(url_for("generate_images", video_id=video_id))
 
         flash("Image generation started!", "success")
         return redirect(url_for("process_images", video_id=video.id))
@@ -84,3 +192,30 @@ def generate_images(video_id):
 def process_images(video_id):
     video = Video.query.get_or_404(video_id)
     return render_template("process_images.html", video=video)
+
+
+@app.route("/video/<int:video_id>/images_progress")
+def images_progress(video_id):
+    video = Video.query.get_or_404(video_id)
+    script_data = json.loads(video.script.content) if video.script else {}
+    total = len(
+        [asset for asset in script_data.get("assets", []) if asset and asset.strip()]
+    )
+    completed = Image.query.filter_by(video_id=video.id).count()
+    generated = (
+        Image.query.filter_by(video_id=video.id)
+        .filter(Image.file_path.isnot(None))
+        .count()
+    )
+
+    return jsonify(
+        {
+            "status": video.status,
+            "total": total,
+            "completed": completed,
+            "failed": completed - generated,
+            "progress": video.progress or 0,
+            "is_complete": video.status != "images_processing"
+            or video.id not in image_jobs,
+        }
+    )
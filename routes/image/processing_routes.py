@@ -2,7 +2,7 @@ from flask import request, jsonify, url_for
 from app import app
 from extensions import db
 from models.models import Video, Image
-from image_generator import AIImageGenerator
+from image_store import generate_image, new_salt, release_images
 import os
 
 
@@ -13,26 +13,20 @@ def generate_single_image(video_id, image_id):
     video = Video.query.get_or_404(video_id)
     image = Image.query.get_or_404(image_id)
 
-    image_generator = AIImageGenerator()
-    image_filename = f"video_{video.id}_image_{image.order+1}.png"
-    image_file = os.path.join(app.config["OUTPUT_IMAGES"], image_filename)
+    # Reuses the stored image if any video already has one for this prompt
+    file_path = generate_image(image.prompt, image_style=video.image_style)
 
-    success = image_generator.download_image(
-        image.prompt,
-        image_file,
-        image_style=video.image_style,
-        use_ir=True,
-    )
-
-    if success:
-        # Store relative path in database
-        relative_path = os.path.join("output_images", image_filename)
-        image.file_path = relative_path.replace("\\", "/")  # Ensure forward slashes
+    if file_path:
+        old_path = image.file_path
+        image.file_path = file_path
         db.session.commit()
+        release_images([old_path])
         return jsonify(
             {
                 "success": True,
-                "file_path": url_for("serve_image", filename=image_filename),
+                "file_path": url_for(
+                    "serve_image", filename=os.path.basename(file_path)
+                ),
             }
         )
     else:
@@ -44,42 +38,22 @@ def regenerate_image(video_id, image_id):
     video = Video.query.get_or_404(video_id)
     image = Image.query.get_or_404(image_id)
 
-    # Delete existing image if it exists
-    if image.file_path and os.path.exists(image.file_path):
-        try:
-            os.remove(image.file_path)
-        except:
-            pass
-
-    # Generate new image
-    image_generator = AIImageGenerator()
-    # Use absolute path for file storage
-    image_file = os.path.join(
-        app.config["OUTPUT_IMAGES"], f"video_{video.id}_image_{image.order+1}.png"
-    )
-
     # Get updated prompt if provided
     new_prompt = request.form.get("prompt", image.prompt)
     image.prompt = new_prompt
 
-    success = image_generator.download_image(
-        new_prompt,
-        image_file,
-        image_style=video.image_style,
-        use_ir=True,
+    # A fresh salt makes a new image instead of returning the stored one, and
+    # leaves the old file alone for any other video using it
+    file_path = generate_image(
+        new_prompt, image_style=video.image_style, salt=new_salt()
     )
 
-    if success:
-        # Store relative path in database
-        relative_path = f"output_images/video_{video.id}_image_{image.order+1}.png"
-        image.file_path = relative_path
+    if file_path:
+        old_path = image.file_path
+        image.file_path = file_path
         db.session.commit()
-        return jsonify(
-            {
-                "success": True,
-                "file_path": f"/output_images/video_{video.id}_image_{image.order+1}.png",
-            }
-        )
+        release_images([old_path])
+        return jsonify({"success": True, "file_path": f"/{file_path}"})
     else:
         return jsonify({"success": False, "error": "Failed to regenerate image"})
 
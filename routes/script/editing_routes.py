@@ -20,10 +20,17 @@ def edit_script(video_id):
         action = request.form.get("action", "save")
 
         if action == "regenerate":
-            # Regenerate script using Gemini
+            # Regenerate script using Gemini, skipping the cached response
             generator = GeminiVideoScriptGenerator()
             new_script_data = generator.generate_video_script(
-                video.topic, video.video_type, duration=video.duration
+                video_type=video.video_type,
+                duration=video.duration,
+                style=video.image_style,
+                tone=video.tone,
+                writing_style=video.writing_style,
+                niche=video.niche,
+                main_idea=video.main_idea,
+                force_fresh=True,
             )
 
             if not new_script_data:
@@ -22,6 +22,7 @@ def generate_script(video_id):
             writing_style=video.writing_style,
             niche=video.niche,
             main_idea=video.main_idea,
+            force_fresh=request.form.get("force_fresh") == "on",
         )
 
         if not script_data:
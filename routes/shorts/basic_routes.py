@@ -2,7 +2,8 @@ from flask import render_template, request, redirect, url_for, flash
 from app import app
 from extensions import db
 from models.models import YouTubeSource, YouTubeShort
-from summaries_yt import get_transcript, process_transcript_parts
+from summaries_yt import get_transcript_snippets, process_transcript_parts
+from transcript_index import TranscriptIndex, load_transcript_index
 from utils import extract_json_from_response
 import json
 import re
@@ -14,6 +15,7 @@ def new_shorts():
     if request.method == "POST":
         video_url = request.form.get("video_url")
         num_parts = int(request.form.get("num_parts", 5))
+        force_fresh = request.form.get("force_fresh") == "on"
 
         # Check if we already have this YouTube video
         existing_source = YouTubeSource.query.filter_by(url=video_url).first()
@@ -22,20 +24,29 @@ def new_shorts():
             return redirect(url_for("view_shorts_source", source_id=existing_source.id))
 
         # Get transcript and analyze
-        transcript, language = get_transcript(video_url)
+        snippets, language = get_transcript_snippets(video_url)
 
-        if not transcript:
+        if not snippets:
             flash("Failed to retrieve transcript for this video", "error")
             return redirect(url_for("new_shorts"))
 
-        # Create new YouTube source
-        source = YouTubeSource(url=video_url, transcript=transcript, language=language)
+        # Create new YouTube source, keeping the text for the LLM and the
+        # indexed snippets for timing lookups
+        transcript_index = TranscriptIndex.from_snippets(snippets)
+        source = YouTubeSource(
+            url=video_url,
+            transcript=transcript_index.to_transcript(),
+            transcript_data=transcript_index.to_bytes(),
+            language=language,
+        )
 
         db.session.add(source)
         db.session.commit()
 
         # Start background processing
-        thread = Thread(target=process_shorts_segments, args=(source.id, num_parts))
+        thread = Thread(
+            target=process_shorts_segments, args=(source.id, num_parts, force_fresh)
+        )
         thread.daemon = True
         thread.start()
 
@@ -45,15 +56,22 @@ def new_shorts():
     return render_template("new_shorts.html")
 
 
-def process_shorts_segments(source_id, num_parts):
+def process_shorts_segments(source_id, num_parts, force_fresh=False):
     with app.app_context():
         source = YouTubeSource.query.get(source_id)
         if not source:
             return
 
         try:
-            # Process transcript to get viral segments
-            response = process_transcript_parts(source.transcript, num_parts=num_parts)
+            # Process transcript to get viral segments, chunked from the
+            # stored index so the text is only parsed for older rows
+            response = process_transcript_parts(
+                source.transcript,
+                num_parts=num_parts,
+                language=source.language,
+                force_fresh=force_fresh,
+                snippets=load_transcript_index(source).snippets(),
+            )
             data = extract_json_from_response(response)
 
             if not data:
@@ -3,11 +3,37 @@ from app import app
 from extensions import db
 from models.models import YouTubeSource, YouTubeShort
 import os
-import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from threading import Thread
-import time
-import re
-from generate_captions import generate as generate_captions, burn_subtitles_to_video
+from generate_captions import (
+    asr_slots,
+    check_model_size,
+    transcribe_word_segments,
+    write_ass_captions,
+)
+from transcript_index import load_transcript_index
+from captioner import (
+    get_highlight_color,
+    get_short_word_segments,
+    get_youtube_video_id,
+    get_source_url,
+)
+from media_cache import get_media_cache
+from source_media import (
+    get_source_media,
+    source_media_key,
+    matches_aspect,
+    probe_video_stream,
+    render_short,
+    smart_cut,
+)
+
+# Rendering is ffmpeg work in child processes, so a thread pool is enough to run
+# shorts in parallel. Shared by every source so concurrent jobs don't oversubscribe
+SHORTS_WORKERS = int(os.getenv("SHORTS_WORKERS") or 0) or max(
+    1, (os.cpu_count() or 2) // 2
+)
+shorts_pool = ThreadPoolExecutor(max_workers=SHORTS_WORKERS)
 
 
 @app.route("/shorts/toggle/<int:short_id>", methods=["POST"])
@@ -41,7 +67,13 @@ def generate_shorts(source_id):
         "highlight_type": request.form.get("highlight_type", ""),
         "highlight_color": request.form.get("highlight_color", ""),
         "custom_highlight_color": request.form.get("custom_highlight_color", ""),
+        "model_size": request.form.get("model_size", "base"),
     }
+    try:
+        check_model_size(caption_settings["model_size"])
+    except ValueError as e:
+        flash(str(e), "error")
+        return redirect(url_for("view_shorts_source", source_id=source_id))
 
     # Start background processing
     thread = Thread(target=process_generate_shorts, args=(source_id, caption_settings))
@@ -52,6 +84,117 @@ def generate_shorts(source_id):
     return redirect(url_for("view_shorts_source", source_id=source_id))
 
 
+def build_short_captions(
+    short,
+    source_media,
+    transcript_index,
+    source_id,
+    source_url,
+    source_segments,
+    settings,
+):
+    """Write a short's captions as an ASS file on the short's timeline"""
+    segments = get_short_word_segments(
+        settings,
+        transcript_index,
+        short["start_time"],
+        short["end_time"],
+        source_id,
+        source_url,
+        source_segments,
+    )
+    if not segments:
+        # Neither transcript covers the short, transcribe just its range
+        with asr_slots:
+            segments = transcribe_word_segments(
+                source_media,
+                model_size=settings.get("model_size", "base"),
+                start=short["start_time"],
+                duration=short["end_time"] - short["start_time"],
+            )
+
+    ass_path = os.path.join(app.config["OUTPUT_FOLDER"], f"short_{short['id']}.ass")
+    write_ass_captions(
+        segments,
+        ass_path,
+        max_words_per_caption=settings.get("max_words", 1),
+        highlight_color=get_highlight_color(settings),
+        font_size=settings.get("font_size", 40),
+        position=settings.get("position", "bottom"),
+    )
+    return ass_path
+
+
+def generate_short(
+    short,
+    source_media,
+    video_id,
+    transcript_index,
+    source_id,
+    source_url,
+    source_segments,
+    caption_settings,
+):
+    """
+    Render one short from the local source. Runs on the shorts pool and only
+    touches files; the caller records the result in the database.
+
+    Returns:
+        str: Basename of the rendered short, or None if rendering failed
+    """
+    start_time = short["start_time"]
+    duration = short["end_time"] - short["start_time"]
+
+    # Write the captions first so they are burned in the same encode
+    ass_path = None
+    if caption_settings and caption_settings.get("add_captions"):
+        try:
+            ass_path = build_short_captions(
+                short,
+                source_media,
+                transcript_index,
+                source_id,
+                source_url,
+                source_segments,
+                caption_settings,
+            )
+        except Exception as e:
+            print(f"Error adding captions to short {short['id']}: {str(e)}")
+            # If caption generation fails, still render the short
+            ass_path = None
+
+    # Without captions a 9:16 source needs no filtering, so re-encode only the
+    # partial GOPs at the cut points and stream-copy the rest
+    if not ass_path and matches_aspect(probe_video_stream(source_media)):
+        output_file = os.path.join(
+            app.config["OUTPUT_FOLDER"], f"short_{short['id']}_{video_id}_mobile.mp4"
+        )
+        if smart_cut(source_media, start_time, duration, output_file):
+            return os.path.basename(output_file)
+
+    # Cut, reframe to 9:16 and burn captions in one ffmpeg run
+    output_file = os.path.join(
+        app.config["OUTPUT_FOLDER"],
+        f"short_{short['id']}_{video_id}_{'with_subs' if ass_path else 'mobile'}.mp4",
+    )
+    result = render_short(source_media, start_time, duration, output_file, ass_path)
+
+    if result.returncode != 0 and ass_path:
+        print(f"Error burning captions into short {short['id']}: {result.stderr}")
+        output_file = os.path.join(
+            app.config["OUTPUT_FOLDER"], f"short_{short['id']}_{video_id}_mobile.mp4"
+        )
+        result = render_short(source_media, start_time, duration, output_file)
+
+    if ass_path and os.path.exists(ass_path):
+        os.remove(ass_path)
+
+    if result.returncode == 0 and os.path.exists(output_file):
+        return os.path.basename(output_file)
+    print(f"Failed to generate short: {result.stderr}")
+    return None
+
+
 def process_generate_shorts(source_id, caption_settings=None):
     with app.app_context():
         source = YouTubeSource.query.get(source_id)
@@ -62,157 +205,60 @@ def process_generate_shorts(source_id, caption_settings=None):
             youtube_source_id=source_id, selected=True
         ).all()
 
-        video_id = re.search(r"(?:v=|\/)([0-9A-Za-z_-]{11}).*", source.url)
-        if not video_id:
-            return
+        # Mark everything as processing up front so progress covers the download
+        for short in selected_shorts:
+            short.status = "processing"
+        db.session.commit()
 
-        video_id = video_id.group(1)
+        video_id = get_youtube_video_id(source.url) or str(source.id)
+        source_url = get_source_url(source)
+        transcript_index = load_transcript_index(source)
+        source_segments = {}  # Whole-source ASR, only built when needed
 
-        for short in selected_shorts:
+        # Keep the source in the media cache until every short is rendered
+        with get_media_cache().pinned(source_media_key(source_url)):
+            # Download the source once, every short is cut from the local copy
             try:
-                short.status = "processing"
+                source_media = get_source_media(source.id, source_url)
+            except Exception as e:
+                print(f"Error downloading source {source.id}: {str(e)}")
+                for short in selected_shorts:
+                    short.status = "failed"
                 db.session.commit()
-
-                # Create output filename
-                output_file = os.path.join(
-                    app.config["OUTPUT_FOLDER"], f"short_{short.id}_{video_id}.mp4"
-                )
-
-                # Use yt-dlp to download the segment
-                start_time = short.start_time
-                duration = short.end_time - short.start_time
-
-                command = [
-                    "yt-dlp",
-                    "-f",
-                    "best[height<=1080]",
-                    "--external-downloader",
-                    "ffmpeg",
-                    "--external-downloader-args",
-                    f"ffmpeg_i:-ss {start_time} -t {duration}",
-                    "-o",
-                    output_file,
-                    f"https://www.youtube.com/watch?v={video_id}",
-                ]
-
-                result = subprocess.run(command, capture_output=True, text=True)
-
-                if os.path.exists(output_file):
-                    # Convert to mobile dimensions (9:16 aspect ratio)
-                    mobile_output_file = os.path.join(
-                        app.config["OUTPUT_FOLDER"],
-                        f"short_{short.id}_{video_id}_mobile.mp4",
-                    )
-
-                    # Use ffmpeg to resize to 1080x1920 (9:16 ratio) with background padding
-                    mobile_command = [
-                        "ffmpeg",
-                        "-i",
-                        output_file,
-                        "-vf",
-                        "scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black",
-                        "-c:a",
-                        "copy",
-                        mobile_output_file,
-                    ]
-
-                    mobile_result = subprocess.run(
-                        mobile_command, capture_output=True, text=True
-                    )
-
-                    if os.path.exists(mobile_output_file):
-                        # Remove the original file to save space
-                        try:
-                            os.remove(output_file)
-                        except Exception as e:
-                            print(f"Error removing original file: {str(e)}")
-
-                        # Update the output file path for further processing
-                        output_file = mobile_output_file
-                    else:
-                        print(
-                            f"Failed to convert to mobile dimensions: {mobile_result.stderr}"
-                        )
-
-                    # Process captions if requested
-                    if caption_settings and caption_settings.get("add_captions"):
-                        try:
-                            # Determine highlight color
-                            highlight_color = None
-                            if caption_settings.get("enable_highlight"):
-                                highlight_type = caption_settings.get("highlight_type")
-                                if highlight_type == "custom":
-                                    highlight_color = caption_settings.get(
-                                        "custom_highlight_color"
-                                    )
-                                else:
-                                    highlight_color = caption_settings.get(
-                                        "highlight_color"
-                                    )
-
-                            # Generate captions
-                            srt_path = os.path.join(
-                                app.config["OUTPUT_FOLDER"], f"short_{short.id}.srt"
-                            )
-                            generate_captions(
-                                media_file=output_file,
-                                max_words_per_caption=caption_settings.get(
-                                    "max_words", 1
-                                ),
-                                highlight_color=highlight_color,
-                                caption_format="srt",
-                                output_filename=srt_path,
-                            )
-
-                            # Burn captions into video
-                            output_with_captions = os.path.join(
-                                app.config["OUTPUT_FOLDER"],
-                                f"short_{short.id}_{video_id}_with_subs.mp4",
-                            )
-                            burn_subtitles_to_video(
-                                video_path=output_file,
-                                srt_path=srt_path,
-                                output_path=output_with_captions,
-                                font_size=caption_settings.get("font_size", 40),
-                                position=caption_settings.get("position", "bottom"),
-                            )
-
-                            # If caption generation was successful, use the new file
-                            if os.path.exists(output_with_captions):
-                                # Remove the original file to save space
-                                try:
-                                    os.remove(output_file)
-                                except Exception as e:
-                                    print(f"Error removing original file: {str(e)}")
-
-                                # Update the output file path
-                                short.output_file = os.path.basename(
-                                    output_with_captions
-                                )
-                            else:
-                                # If caption generation failed, keep the original file
-                                short.output_file = os.path.basename(output_file)
-                        except Exception as e:
-                            print(
-                                f"Error adding captions to short {short.id}: {str(e)}"
-                            )
-                            # If caption generation fails, still keep the original video
-                            short.output_file = os.path.basename(output_file)
-                    else:
-                        # No captions requested, use the original file
-                        short.output_file = os.path.basename(output_file)
-
+                return
+
+            # Shorts render in parallel, statuses are recorded here as they finish
+            futures = {
+                shorts_pool.submit(
+                    generate_short,
+                    {
+                        "id": short.id,
+                        "start_time": short.start_time,
+                        "end_time": short.end_time,
+                    },
+                    source_media,
+                    video_id,
+                    transcript_index,
+                    source.id,
+                    source_url,
+                    source_segments,
+                    caption_settings,
+                ): short
+                for short in selected_shorts
+            }
+            for future in as_completed(futures):
+                short = futures[future]
+                try:
+                    output_file = future.result()
+                except Exception as e:
+                    print(f"Error generating short {short.id}: {str(e)}")
+                    output_file = None
+
+                if output_file:
+                    short.output_file = output_file
                     short.status = "completed"
                 else:
                     short.status = "failed"
-                    print(f"Failed to generate short: {result.stderr}")
-
-                db.session.commit()
-                time.sleep(1)  # Prevent rate limiting
-
-            except Exception as e:
-                print(f"Error generating short {short.id}: {str(e)}")
-                short.status = "failed"
                 db.session.commit()
 
 
@@ -2,6 +2,8 @@ from flask import render_template, redirect, url_for, flash, send_file
 from app import app
 from extensions import db
 from models.models import YouTubeSource, YouTubeShort
+from transcript_cache import invalidate_source_transcript
+from source_media import remove_source_media
 import os
 
 
@@ -100,8 +102,11 @@ def delete_shorts_source(source_id):
             db.session.delete(short)
 
         # Delete the source
+        source_url = source.url
         db.session.delete(source)
         db.session.commit()
+        invalidate_source_transcript(source_id)
+        remove_source_media(source_url)
 
         flash("YouTube source and all associated shorts have been deleted", "success")
     except Exception as e:
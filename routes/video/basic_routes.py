@@ -3,6 +3,7 @@ from app import app
 from extensions import db
 from models.models import Video, Script
 from generate_script import GeminiVideoScriptGenerator
+from image_store import release_images
 import json
 import os
 import threading
@@ -44,7 +45,10 @@ def new_video():
         db.session.commit()
 
         # Start the background task
-        thread = threading.Thread(target=generate_script_task, args=(video.id,))
+        force_fresh = request.form.get("force_fresh") == "on"
+        thread = threading.Thread(
+            target=generate_script_task, args=(video.id, force_fresh)
+        )
         thread.daemon = True
         thread.start()
 
@@ -57,7 +61,7 @@ def new_video():
     return render_template("new_video.html")
 
 
-def generate_script_task(video_id):
+def generate_script_task(video_id, force_fresh=False):
     with app.app_context():
         video = Video.query.get(video_id)
         if not video:
@@ -73,6 +77,7 @@ def generate_script_task(video_id):
                 writing_style=video.writing_style,
                 niche=video.niche,
                 main_idea=video.main_idea,
+                force_fresh=force_fresh,
             )
 
             if script_data:
@@ -117,17 +122,8 @@ def delete_video(video_id):
         except Exception as e:
             print(f"Error removing audio file: {str(e)}")
 
-    for image in video.images:
-        if image.file_path:
-            try:
-                image_path = os.path.join(
-                    app.config["OUTPUT_IMAGES"],
-                    os.path.basename(image.file_path.replace("output_images/", "")),
-                )
-                if os.path.exists(image_path):
-                    os.remove(image_path)
-            except Exception as e:
-                print(f"Error removing image file: {str(e)}")
+    # Images are released after the rows are gone, keeping ones other videos use
+    image_paths = [image.file_path for image in video.images]
 
     # Delete video files using stored paths
     if video.video_path:
@@ -148,6 +144,7 @@ def delete_video(video_id):
 
     db.session.delete(video)
     db.session.commit()
+    release_images(image_paths)
 
     flash("Video project deleted successfully!", "success")
     return redirect(url_for("index"))
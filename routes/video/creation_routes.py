@@ -2,13 +2,15 @@ from flask import render_template, request, redirect, url_for, flash, jsonify
 from app import app
 from extensions import db
 from models.models import Video
-from generate_captions import generate as generate_captions, burn_subtitles_to_video
+from generate_captions import burn_subtitles_to_video, check_model_size
+from captioner import write_video_captions
 from video_creator import (
     cleanup_temp_files,
     start_video_creation_background,
     get_relative_video_path,
 )
 import os
+import json
 from datetime import datetime
 
 
@@ -102,31 +104,38 @@ def add_captions(video_id):
     if request.method == "POST":
         try:
             # Get caption settings from form
-            max_words = int(request.form.get("max_words", 1))
-            font_size = int(request.form.get("font_size", 40))
-            position = request.form.get("position", "bottom")
-
-            # Handle highlight settings
-            enable_highlight = request.form.get("enable_highlight") == "on"
-            highlight_color = None
-
-            if enable_highlight:
-                highlight_type = request.form.get("highlight_type")
-                if highlight_type == "custom":
-                    highlight_color = request.form.get("custom_highlight_color")
-                else:
-                    highlight_color = request.form.get("highlight_color")
+            settings = {
+                "max_words": int(request.form.get("max_words", 1)),
+                "font_size": int(request.form.get("font_size", 40)),
+                "position": request.form.get("position", "bottom"),
+                "model_size": check_model_size(request.form.get("model_size", "base")),
+                "caption_source": request.form.get("caption_source", "timings"),
+                "language": request.form.get("language", "en"),
+                "enable_highlight": request.form.get("enable_highlight") == "on",
+                "highlight_type": request.form.get("highlight_type"),
+                "highlight_color": request.form.get("highlight_color"),
+                "custom_highlight_color": request.form.get("custom_highlight_color"),
+            }
 
             # Generate captions
             srt_path = os.path.join(
                 app.config["OUTPUT_FOLDER"], f"video_{video.id}.srt"
             )
-            generate_captions(
-                media_file=video_path,
-                max_words_per_caption=max_words,
-                highlight_color=highlight_color,
-                caption_format="srt",
-                output_filename=srt_path,
+            write_video_captions(
+                video_path,
+                srt_path,
+                settings,
+                timings=(
+                    json.loads(video.script.timings)
+                    if video.script and video.script.timings
+                    else None
+                ),
+                script_lines=(
+                    json.loads(video.script.content).get("script", [])
+                    if video.script
+                    else []
+                ),
+                language=video.script.language if video.script else None,
             )
 
             # Burn captions into video
@@ -137,8 +146,8 @@ def add_captions(video_id):
                 video_path=video_path,
                 srt_path=srt_path,
                 output_path=output_video_path,
-                font_size=font_size,
-                position=position,
+                font_size=settings["font_size"],
+                position=settings["position"],
             )
 
             # Update video status and path in database
@@ -0,0 +1,451 @@
+from app import app
+from media_cache import get_media_cache
+import hashlib
+import json
+import os
+import re
+import subprocess
+import threading
+import uuid
+from urllib.parse import parse_qs, urlparse
+
+# yt-dlp format for source downloads, a single file with audio and video
+SOURCE_MEDIA_FORMAT = "best[height<=1080]"
+
+# Downloads are network-bound and limited separately from rendering
+SOURCE_DOWNLOADS = int(os.getenv("SOURCE_DOWNLOADS") or 2)
+download_slots = threading.BoundedSemaphore(SOURCE_DOWNLOADS)
+
+YOUTUBE_HOSTS = ("youtube.com", "youtu.be")
+YOUTUBE_ID = re.compile(r"[0-9A-Za-z_-]{11}")
+
+
+def get_youtube_video_id(url):
+    """
+    Get the video id of a youtube.com or youtu.be URL, or None for any other
+    URL, such as a local HTTP server standing in for YouTube.
+    """
+    parsed = urlparse(url or "")
+    host = (parsed.hostname or "").lower()
+    if not any(host == name or host.endswith(f".{name}") for name in YOUTUBE_HOSTS):
+        return None
+
+    if host.endswith("youtu.be"):
+        candidate = parsed.path.strip("/").split("/")[0]
+    else:
+        candidate = parse_qs(parsed.query).get("v", [""])[0]
+        parts = parsed.path.strip("/").split("/")
+        if not candidate and len(parts) >= 2 and parts[0] in (
+            "shorts",
+            "embed",
+            "live",
+            "v",
+        ):
+            candidate = parts[1]
+    return candidate if YOUTUBE_ID.fullmatch(candidate or "") else None
+
+
+def source_media_key(url):
+    """Cache key of a source's media: the YouTube video id, or a hash of the URL"""
+    video_id = get_youtube_video_id(url)
+    if video_id:
+        return f"youtube:{video_id}"
+    return f"url:{hashlib.sha256(url.encode('utf-8')).hexdigest()}"
+
+
+def get_source_media(source_id, url):
+    """
+    Get a local copy of a source's media from the media cache, downloading it
+    with yt-dlp on a miss.
+
+    Callers that keep using the file should pin source_media_key(url) in the
+    media cache around the whole job, so the file can't be evicted under them.
+
+    Args:
+        source_id: ID of the YouTubeSource
+        url: URL yt-dlp downloads from (a YouTube watch URL, or any direct
+            media URL such as a local HTTP server)
+
+    Returns:
+        str: Path of the cached media
+    """
+    cache = get_media_cache()
+    key = source_media_key(url)
+    with cache.key_lock(key):
+        path = cache.get(key)
+        if path:
+            return path
+
+        command = [
+            "yt-dlp",
+            "-f",
+            SOURCE_MEDIA_FORMAT,
+            "--no-playlist",
+            "-o",
+            f"{cache.path_template(key)}.%(ext)s",
+            url,
+        ]
+        with download_slots:
+            print(f"Downloading source {source_id} once for all of its shorts")
+            result = subprocess.run(command, capture_output=True, text=True)
+
+        path = cache.find_written(key)
+        if not path:
+            raise Exception(f"Failed to download source media: {result.stderr}")
+        return cache.put(key, path)
+
+
+def cut_clip(
+    media_file, start_time, duration, output_file, video_only=False, annexb=False
+):
+    """
+    Cut [start_time, start_time + duration) out of a local media file without
+    re-encoding. The cut starts on the keyframe at or before start_time.
+
+    With annexb, H.264 is rewritten to Annex B with its parameter sets in-band,
+    for splicing in MPEG-TS.
+    """
+    command = [
+        "ffmpeg",
+        "-y",
+        "-ss",
+        str(start_time),
+        "-i",
+        media_file,
+        "-t",
+        str(duration),
+    ]
+    if video_only:
+        command += ["-map", "0:v:0", "-an"]
+    if annexb:
+        command += ["-bsf:v", "h264_mp4toannexb"]
+    command += [
+        "-c",
+        "copy",
+        "-avoid_negative_ts",
+        "make_zero",
+        output_file,
+    ]
+    return subprocess.run(command, capture_output=True, text=True)
+
+
+def probe_video_stream(media_file):
+    """Get codec, size, pixel format and profile of the first video stream"""
+    command = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "stream=codec_name,width,height,pix_fmt,profile",
+        "-of",
+        "json",
+        media_file,
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    try:
+        return json.loads(result.stdout)["streams"][0]
+    except (ValueError, KeyError, IndexError):
+        return None
+
+
+def probe_keyframes(media_file, start_time, end_time):
+    """
+    Read keyframe timestamps in [start_time, end_time] from the packet index,
+    without decoding any frames.
+    """
+    command = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-read_intervals",
+        f"{max(0, start_time - 1)}%{end_time + 1}",
+        "-show_entries",
+        "packet=pts_time,flags",
+        "-of",
+        "csv=p=0",
+        media_file,
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            time = float(pts_time)
+            if start_time <= time <= end_time:
+                keyframes.append(time)
+    return sorted(keyframes)
+
+
+def matches_aspect(stream, width=1080, height=1920, tolerance=0.01):
+    """Whether a probed video stream already has the target aspect ratio"""
+    if not stream or not stream.get("width") or not stream.get("height"):
+        return False
+    return abs(stream["width"] / stream["height"] - width / height) < tolerance
+
+
+# x264 profiles ffprobe reports for sources we can splice into
+X264_PROFILES = {"Baseline": "baseline", "Main": "main", "High": "high"}
+
+# Partial GOPs shorter than this are left out instead of encoded
+MIN_PART_SECONDS = 0.02
+
+
+def encode_part(media_file, start_time, duration, output_file, stream):
+    """
+    Re-encode a partial GOP so it can be spliced with stream-copied video.
+    Written as MPEG-TS, so its SPS/PPS travel in-band with the frames.
+    """
+    command = [
+        "ffmpeg",
+        "-y",
+        "-ss",
+        str(start_time),
+        "-i",
+        media_file,
+        "-t",
+        str(duration),
+        "-map",
+        "0:v:0",
+        "-an",
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-crf",
+        "18",
+        "-pix_fmt",
+        stream.get("pix_fmt") or "yuv420p",
+    ]
+    profile = X264_PROFILES.get(stream.get("profile"))
+    if profile:
+        command += ["-profile:v", profile]
+    command.append(output_file)
+    return subprocess.run(command, capture_output=True, text=True)
+
+
+def smart_cut(media_file, start_time, duration, output_file):
+    """
+    Cut a clip while re-encoding as little as possible: video between the
+    first and last keyframe inside the range is stream-copied, and only the
+    partial GOPs at the head and tail are re-encoded and spliced on. Audio is
+    copied once for the whole range.
+
+    The parts are joined as MPEG-TS (Annex B), where every part carries its own
+    SPS/PPS in-band: the encoded parts' parameter sets never match the source's
+    exactly, and an MP4 part would only keep the first file's. The result is
+    decoded once and dropped if the decoder reports any error.
+
+    Only H.264 sources can be spliced this way.
+
+    Returns:
+        bool: True if the clip was written, False if the caller should fall
+            back to a full re-encode
+    """
+    stream = probe_video_stream(media_file)
+    if not stream or stream.get("codec_name") != "h264":
+        return False
+
+    end_time = start_time + duration
+    keyframes = probe_keyframes(media_file, start_time, end_time)
+    if len(keyframes) < 2:
+        return False
+    first_key, last_key = keyframes[0], keyframes[-1]
+
+    prefix = os.path.join(app.config["TEMP_FOLDER"], f"cut_{uuid.uuid4().hex}")
+    list_path = f"{prefix}.txt"
+    parts = []
+    try:
+        if first_key - start_time > MIN_PART_SECONDS:
+            parts.append(f"{prefix}_head.ts")
+            if encode_part(
+                media_file, start_time, first_key - start_time, parts[-1], stream
+            ).returncode:
+                return False
+
+        parts.append(f"{prefix}_middle.ts")
+        if cut_clip(
+            media_file,
+            first_key,
+            last_key - first_key,
+            parts[-1],
+            video_only=True,
+            annexb=True,
+        ).returncode:
+            return False
+
+        if end_time - last_key > MIN_PART_SECONDS:
+            parts.append(f"{prefix}_tail.ts")
+            if encode_part(
+                media_file, last_key, end_time - last_key, parts[-1], stream
+            ).returncode:
+                return False
+
+        with open(list_path, "w", encoding="utf-8") as f:
+            for part in parts:
+                f.write(f"file '{part}'\n")
+
+        audio_codec = "copy" if probe_audio_codec(media_file) == "aac" else "aac"
+        command = [
+            "ffmpeg",
+            "-y",
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            list_path,
+            "-ss",
+            str(start_time),
+            "-t",
+            str(duration),
+            "-i",
+            media_file,
+            "-map",
+            "0:v:0",
+            "-map",
+            "1:a:0?",
+            "-c:v",
+            "copy",
+            "-c:a",
+            audio_codec,
+            "-movflags",
+            "+faststart",
+            output_file,
+        ]
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"Error splicing clip: {result.stderr}")
+            return False
+        if not os.path.exists(output_file):
+            return False
+        if not decodes_cleanly(output_file):
+            print("Spliced clip doesn't decode cleanly, re-encoding it instead")
+            os.remove(output_file)
+            return False
+        return True
+    finally:
+        for path in parts + [list_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def decodes_cleanly(media_file):
+    """Decode a file's video and check the decoder reported no errors"""
+    command = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-i",
+        media_file,
+        "-map",
+        "0:v:0",
+        "-f",
+        "null",
+        "-",
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    return result.returncode == 0 and not result.stderr.strip()
+
+
+def probe_audio_codec(media_file):
+    """Get the codec name of a media file's first audio stream, or None"""
+    command = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "a:0",
+        "-show_entries",
+        "stream=codec_name",
+        "-of",
+        "default=noprint_wrappers=1:nokey=1",
+        media_file,
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def render_short(
+    media_file,
+    start_time,
+    duration,
+    output_file,
+    subtitles_path=None,
+    width=1080,
+    height=1920,
+    reframe="pad",
+):
+    """
+    Render a short from the source with a single ffmpeg encode: seek and trim,
+    reframe to width x height and burn ASS captions in one filter graph.
+
+    Args:
+        media_file: Local source media
+        start_time: Start of the short in the source, in seconds
+        duration: Length of the short in seconds
+        output_file: Path of the mp4 to write
+        subtitles_path: Optional ASS file on the short's timeline
+        width, height: Output size (9:16 by default)
+        reframe: "pad" to letterbox the whole frame, "crop" to fill it
+
+    Returns:
+        subprocess.CompletedProcess: The ffmpeg run
+    """
+    if reframe == "crop":
+        filters = [
+            f"scale={width}:{height}:force_original_aspect_ratio=increase",
+            f"crop={width}:{height}",
+        ]
+    else:
+        filters = [
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease",
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black",
+        ]
+    cwd = None
+    if subtitles_path:
+        # Run next to the ASS file so its path needs no filter escaping
+        cwd = os.path.dirname(os.path.abspath(subtitles_path))
+        filters.append(f"subtitles={os.path.basename(subtitles_path)}")
+
+    # AAC goes into the mp4 as it is, anything else is re-encoded
+    audio_codec = "copy" if probe_audio_codec(media_file) == "aac" else "aac"
+
+    command = [
+        "ffmpeg",
+        "-y",
+        "-ss",
+        str(start_time),
+        "-i",
+        os.path.abspath(media_file),
+        "-t",
+        str(duration),
+        "-map",
+        "0:v:0",
+        "-map",
+        "0:a:0?",
+        "-vf",
+        ",".join(filters),
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-crf",
+        "20",
+        "-pix_fmt",
+        "yuv420p",
+        "-c:a",
+        audio_codec,
+        "-movflags",
+        "+faststart",
+        os.path.abspath(output_file),
+    ]
+    return subprocess.run(command, capture_output=True, text=True, cwd=cwd)
+
+
+def remove_source_media(url):
+    """Drop a source's media from the cache, unless a running job uses it"""
+    get_media_cache().remove(source_media_key(url))
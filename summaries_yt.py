@@ -1,8 +1,10 @@
+import asyncio
 import json
 import os
-import google.generativeai as genai
+import re
 from youtube_transcript_api import YouTubeTranscriptApi
 from langdetect import detect
+from llm_cache import cached_generate
 from utils import extract_json_from_response
 
 
@@ -14,7 +16,13 @@ def get_video_id(video_url):
     return video_id
 
 
-def get_transcript(video_url):
+def get_transcript_snippets(video_url):
+    """
+    Fetch the auto-generated transcript of a video.
+
+    Returns:
+        tuple: ([(start, duration, text)], language), or (None, None)
+    """
     video_id = get_video_id(video_url)
     print(f"Fetching transcript for video ID: {video_id}")
 
@@ -33,26 +41,60 @@ def get_transcript(video_url):
             print("No auto-generated transcript found.")
             return None, None
 
-        full_transcript = ""
         print(transcript[0])
         print(transcript[-1])
-        for snippet in transcript:
-            full_transcript += (
-                f"start:{snippet.start} duration:{snippet.duration} "
-                + snippet.text
-                + "\n"
-            )
+        snippets = [
+            (snippet.start, snippet.duration, snippet.text) for snippet in transcript
+        ]
 
-        lang = detect(full_transcript)
+        lang = detect(" ".join(text for _, _, text in snippets))
         print(f"Detected language: {lang}")
 
-        return full_transcript, lang
+        return snippets, lang
 
     except Exception as e:
         print(f"Error fetching transcript: {e}")
         return None, None
 
 
+def format_transcript(snippets):
+    """Render snippets as the "start:… duration:… text" lines sent to the LLM"""
+    return "".join(
+        f"start:{start} duration:{duration} {text}\n"
+        for start, duration, text in snippets
+    )
+
+
+def get_transcript(video_url):
+    snippets, lang = get_transcript_snippets(video_url)
+    if not snippets:
+        return None, None
+    return format_transcript(snippets), lang
+
+
+TRANSCRIPT_LINE = re.compile(r"^start:([\d.]+) duration:([\d.]+) ?(.*)$")
+
+
+def parse_transcript(transcript):
+    """
+    Parse a transcript built by get_transcript back into snippets.
+
+    Returns:
+        list: (start, duration, text) tuples in transcript order
+    """
+    snippets = []
+    for line in (transcript or "").splitlines():
+        match = TRANSCRIPT_LINE.match(line)
+        if match:
+            start, duration, text = match.groups()
+            snippets.append((float(start), float(duration), text))
+        elif snippets and line.strip():
+            # Snippet text can itself contain line breaks
+            start, duration, text = snippets[-1]
+            snippets[-1] = (start, duration, f"{text} {line.strip()}")
+    return snippets
+
+
 def split_transcript_into_parts(transcript, max_chars=5000):
     words = transcript.split()
     parts = []
@@ -73,7 +115,43 @@ def split_transcript_into_parts(transcript, max_chars=5000):
     return parts
 
 
-genai.configure(api_key=os.environ.get("GOOGLE_API_KEY"))
+def split_snippets_into_chunks(snippets, max_tokens, overlap_seconds, count_tokens):
+    """
+    Pack whole snippets into chunks of at most max_tokens. Each chunk starts
+    with the snippets from the last overlap_seconds of the previous one, so a
+    moment spanning a boundary is seen whole by one of the chunks.
+
+    Returns:
+        list: Lists of (start, duration, text) snippets
+    """
+    costs = [count_tokens(format_transcript([snippet])) for snippet in snippets]
+    chunks = []
+    first = 0
+    while first < len(snippets):
+        # A single snippet over the budget still gets a chunk of its own
+        last = first + 1
+        used = costs[first]
+        while last < len(snippets) and used + costs[last] <= max_tokens:
+            used += costs[last]
+            last += 1
+        chunks.append(snippets[first:last])
+        if last >= len(snippets):
+            break
+
+        # Step back into the chunk for the overlap, up to half the budget
+        chunk_end = snippets[last - 1][0] + snippets[last - 1][1]
+        next_first = last
+        overlap = 0
+        while (
+            next_first - 1 > first
+            and snippets[next_first - 1][0] >= chunk_end - overlap_seconds
+            and overlap + costs[next_first - 1] <= max_tokens // 2
+        ):
+            next_first -= 1
+            overlap += costs[next_first]
+        first = next_first
+    return chunks
+
 
 generation_config = {
     "temperature": 1,
@@ -83,81 +161,316 @@ generation_config = {
     "response_mime_type": "text/plain",
 }
 
-model = genai.GenerativeModel(
-    model_name="gemini-2.0-flash-lite",
-    generation_config=generation_config,
-)
+# Map requests in flight at once while analyzing a long transcript
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY") or 4)
 
+# Token budget of each analyzed chunk, and how much of the end of a chunk the
+# next one repeats
+ANALYSIS_CHUNK_TOKENS = int(os.getenv("ANALYSIS_CHUNK_TOKENS") or 8000)
+ANALYSIS_OVERLAP_SECONDS = float(os.getenv("ANALYSIS_OVERLAP_SECONDS") or 30)
 
-def process_transcript_parts(transcript, num_parts=10, max_chars=6000):
-    parts = split_transcript_into_parts(transcript, max_chars=max_chars)
-    print(f"\nAnalyzing {len(parts)} parts for viral potential:")
-    history = []
-    for i, part in enumerate(parts, 1):
-        history.append(
-            {"role": "user", "parts": [{"text": f"Part {i}/{len(parts)}: {part}"}]}
-        )
-        history.append(
-            {
-                "role": "model",
-                "parts": [{"text": f"Received part {i}"}],
-            }
+# Characters per token measured with the model's tokenizer, by (model, language)
+DEFAULT_CHARS_PER_TOKEN = 4.0
+chars_per_token = {}
+
+model = None
+
+
+def get_model():
+    """
+    Configure genai and build the analysis model on first use.
+
+    GEMINI_API_ENDPOINT points the client at another host over REST, e.g. a
+    local stub server for tests.
+    """
+    global model
+    if model is None:
+        import google.generativeai as genai
+
+        options = {"api_key": os.environ.get("GOOGLE_API_KEY")}
+        endpoint = os.getenv("GEMINI_API_ENDPOINT")
+        if endpoint:
+            options["transport"] = "rest"
+            options["client_options"] = {"api_endpoint": endpoint}
+        genai.configure(**options)
+        model = genai.GenerativeModel(
+            model_name="gemini-2.0-flash-lite",
+            generation_config=generation_config,
         )
+    return model
+
+
+def generate_text(prompt, force_fresh=False):
+    """
+    Get the analysis model's response text for a prompt, through the LLM cache.
+    Every analysis prompt asks for JSON, so only responses that parse are cached.
+    """
+    model = get_model()
+    return cached_generate(
+        model.model_name,
+        generation_config,
+        prompt,
+        lambda: model.generate_content(prompt).text,
+        force_fresh=force_fresh,
+        validate=lambda text: extract_json_from_response(text) is not None,
+    )
+
+
+def get_chars_per_token(sample, language=None):
+    """
+    Measure characters per token of the analysis model on a sample, once per
+    (model, language), falling back to a rough constant if counting fails.
+    """
+    model = get_model()
+    key = (model.model_name, language)
+    if key not in chars_per_token:
+        try:
+            tokens = model.count_tokens(sample).total_tokens
+            chars_per_token[key] = len(sample) / max(1, tokens)
+        except Exception as e:
+            print(f"Error counting tokens, using an estimate: {str(e)}")
+            return DEFAULT_CHARS_PER_TOKEN
+    return chars_per_token[key]
+
+
+def split_transcript_into_chunks(
+    transcript,
+    max_tokens=ANALYSIS_CHUNK_TOKENS,
+    overlap_seconds=ANALYSIS_OVERLAP_SECONDS,
+    language=None,
+    snippets=None,
+):
+    """
+    Split a timestamped transcript into token-budgeted, overlapping chunks.
+
+    snippets are the transcript's (start, duration, text) snippets when the
+    caller already has them, e.g. from a stored TranscriptIndex; the transcript
+    string is only parsed without them.
+    """
+    if snippets is None:
+        snippets = parse_transcript(transcript)
+    ratio = get_chars_per_token(transcript[:8000], language)
+    if not snippets:
+        # Not a timestamped transcript, fall back to packing words
+        return split_transcript_into_parts(transcript, int(max_tokens * ratio))
+
+    chunks = split_snippets_into_chunks(
+        snippets,
+        max_tokens,
+        overlap_seconds,
+        lambda text: len(text) / ratio,
+    )
+    return [format_transcript(chunk) for chunk in chunks]
 
-    chat_session = model.start_chat(history=history)
 
-    viral_prompt = f"""
-    Based on all the transcript parts, identify the {num_parts} most engaging segments that would make great viral short-form videos (45-59 seconds each).
-    For each segment, provide:
-    1. A catchy title that would work well on social media
-    2. The exact content to include
-    3. Why this segment would be engaging
-    4. Estimated duration in seconds
-    5. Key hashtags to use
+SEGMENT_FORMAT = """
+    {
+        "title": "...", // title will be used when publishing on social media use the lang in the transcript
+        "desc": "...", // description will be used when publishing on social media use the lang in the transcript
+        "viral_potential": "...", // small description why this part might go viral use the lang in the transcript
+        "duration_seconds": X,
+        "hashtags": [...], use the lang in the transcript
+        "hook": "...", // attention-grabbing first 5 seconds
+        "score":"number out of 100 for how viral it is",
+        "timestamp":{"start":'5',"end":'61'}, // in this format the start the first start of the first sentance and end the last end of the last sentance
+        "transcript":"the text in the part"
+    }
+"""
+
+
+def build_map_prompt(part, index, total, num_candidates):
+    return f"""
+    This is part {index}/{total} of a video transcript. Each line is
+    start:the start time in second, duration:the duration of the sentance, then the text.
+
+    {part}
+
+    Identify up to {num_candidates} segments of this part that would make great viral
+    short-form videos (45-59 seconds each). Only use timestamps that appear in this part.
 
     note:
         use the same lang for the generated viral_segments.
-        start:the start time in second,
-        duration:the duration of the sentance,
 
     Return as JSON with format:
     {{
-        "viral_segments": [
-            {{
-                "title": "...", // title will be used when publishing on social media use the lang in the transcript
-                "desc": "...", // description will be used when publishing on social media use the lang in the transcript
-                "viral_potential": "...", // small description why this part might go viral use the lang in the transcript
-                "duration_seconds": X,
-                "hashtags": [...], use the lang in the transcript
-                "hook": "...", // attention-grabbing first 5 seconds
-                "score":"number out of 100 for how viral it is",
-                "timestamp":{{"start":'5',"end":'61'}}, // in this format the start the first start of the first sentance and end the last end of the last sentance
-                "transcript":"the text in the part"
-            }}
-        ],
-        "overall_theme": "...",
+        "viral_segments": [{SEGMENT_FORMAT}],
+        "overall_theme": "...", // theme of this part
         "target_audience": "..."
     }}
 
     Important: Each segment must be self-contained and impactful within 45-59 seconds.
     Focus on moments that are: surprising, emotional, educational, or highly engaging.
     notes:
-        if the part u see is long than 59 seconds then split it into multiple parts 
-            ex:
-                if the parts is 2.4 minuets
-                part 1: 59 seconds
-                part 2: 59 seconds
-                part 3: 42 seconds
+        if the part u see is long than 59 seconds then split it into multiple parts
     """
 
+
+def build_reduce_prompt(candidates, themes, num_parts):
+    summaries = "\n".join(
+        f"{i}. [{c['_start']:.0f}s-{c['_end']:.0f}s] score {c['_score']}: "
+        f"{c.get('title', '')} | hook: {c.get('hook', '')}"
+        for i, c in enumerate(candidates)
+    )
+    return f"""
+    Candidate viral short-form segments from one video:
+    {summaries}
+
+    Themes of the video's parts: {"; ".join(themes[:20])}
+
+    Pick the {num_parts} best candidates for viral shorts, best first, avoiding
+    candidates that cover the same moment. Use the same lang as the candidates.
+
+    Return as JSON with format:
+    {{
+        "ranking": [candidate numbers],
+        "overall_theme": "...",
+        "target_audience": "..."
+    }}
+    """
+
+
+def segment_bounds(segment):
+    """Get (start, end, score) of a candidate segment, or None if it has no valid times"""
     try:
-        response = chat_session.send_message(viral_prompt)
-        return response.text
+        timestamp = segment.get("timestamp", {})
+        start = float(timestamp.get("start", 0))
+        end = float(timestamp.get("end", start + 60))
+        score = int(float(segment.get("score", 0)))
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if end <= start:
+        return None
+    return start, end, score
 
-    except Exception as e:
-        print(f"Error processing viral segments: {str(e)}")
+
+def dedupe_candidates(candidates, limit, max_overlap=0.5):
+    """
+    Keep the best scoring candidates, dropping any that overlap an already kept
+    one by more than max_overlap of the shorter segment.
+    """
+    kept = []
+    for candidate in sorted(candidates, key=lambda c: c["_score"], reverse=True):
+        duplicate = False
+        for other in kept:
+            overlap = min(candidate["_end"], other["_end"]) - max(
+                candidate["_start"], other["_start"]
+            )
+            shorter = min(
+                candidate["_end"] - candidate["_start"], other["_end"] - other["_start"]
+            )
+            if overlap > max_overlap * shorter:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(candidate)
+            if len(kept) >= limit:
+                break
+    return kept
+
+
+async def map_transcript_parts(parts, num_candidates, force_fresh=False):
+    """Ask for candidate segments of every part concurrently, bounded by a semaphore"""
+    semaphore = asyncio.Semaphore(ANALYSIS_CONCURRENCY)
+
+    async def analyze(index, part):
+        prompt = build_map_prompt(part, index, len(parts), num_candidates)
+        async with semaphore:
+            try:
+                text = await asyncio.to_thread(generate_text, prompt, force_fresh)
+                return extract_json_from_response(text)
+            except Exception as e:
+                print(f"Error analyzing part {index}/{len(parts)}: {str(e)}")
+                return None
+
+    return await asyncio.gather(
+        *(analyze(i, part) for i, part in enumerate(parts, 1))
+    )
+
+
+def process_transcript_parts(
+    transcript,
+    num_parts=10,
+    max_tokens=ANALYSIS_CHUNK_TOKENS,
+    overlap_seconds=ANALYSIS_OVERLAP_SECONDS,
+    language=None,
+    force_fresh=False,
+    snippets=None,
+):
+    """
+    Find the num_parts most viral segments of a transcript with map-reduce:
+    every token-budgeted part is scored for candidates concurrently,
+    candidates are deduped, and one small request ranks the shortlist.
+
+    Responses are reused from the LLM cache unless force_fresh is set. Pass the
+    transcript's snippets to chunk them without re-parsing the transcript.
+
+    Returns:
+        str: JSON text with viral_segments, overall_theme and target_audience,
+            or None if no part could be analyzed
+    """
+    parts = split_transcript_into_chunks(
+        transcript, max_tokens, overlap_seconds, language=language, snippets=snippets
+    )
+    print(f"\nAnalyzing {len(parts)} parts for viral potential:")
+
+    # Enough candidates per part that a single strong part can fill the result
+    num_candidates = max(2, min(num_parts, 5))
+    results = asyncio.run(map_transcript_parts(parts, num_candidates, force_fresh))
+
+    candidates = []
+    themes = []
+    for result in results:
+        if not result:
+            continue
+        if result.get("overall_theme"):
+            themes.append(str(result["overall_theme"]))
+        for segment in result.get("viral_segments", []):
+            bounds = segment_bounds(segment)
+            if bounds:
+                segment["_start"], segment["_end"], segment["_score"] = bounds
+                candidates.append(segment)
+
+    if not candidates:
+        print("Error processing viral segments: no candidates found")
         return None
 
+    shortlist = dedupe_candidates(candidates, limit=num_parts * 2)
+    ranked = shortlist[:num_parts]
+    overall_theme = themes[0] if themes else ""
+    target_audience = ""
+
+    if len(shortlist) > num_parts:
+        try:
+            response = generate_text(
+                build_reduce_prompt(shortlist, themes, num_parts), force_fresh
+            )
+            data = extract_json_from_response(response) or {}
+            order = [
+                int(i)
+                for i in data.get("ranking", [])
+                if str(i).isdigit() and int(i) < len(shortlist)
+            ]
+            picked = [shortlist[i] for i in dict.fromkeys(order)]
+            # Top up with the best remaining scores if the ranking came up short
+            picked += [c for c in shortlist if c not in picked]
+            ranked = picked[:num_parts]
+            overall_theme = data.get("overall_theme") or overall_theme
+            target_audience = data.get("target_audience", "")
+        except Exception as e:
+            print(f"Error ranking viral segments, keeping score order: {str(e)}")
+
+    for segment in ranked:
+        for key in ("_start", "_end", "_score"):
+            segment.pop(key, None)
+
+    data = {
+        "viral_segments": ranked,
+        "overall_theme": overall_theme,
+        "target_audience": target_audience,
+    }
+    # Fenced like a model response, so extract_json_from_response keeps apostrophes
+    return f"```json\n{json.dumps(data, ensure_ascii=False)}\n```"
+
 
 if __name__ == "__main__":
     video_url = "https://www.youtube.com/watch?v=id"
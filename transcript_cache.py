@@ -0,0 +1,104 @@
+from app import app
+import glob
+import json
+import os
+import threading
+from datetime import datetime
+
+# One lock per cached transcript so concurrent jobs don't transcribe it twice
+source_locks = {}
+source_locks_lock = threading.Lock()
+
+
+def get_source_lock(source_id, backend, model_size):
+    with source_locks_lock:
+        return source_locks.setdefault(
+            (source_id, backend, model_size), threading.Lock()
+        )
+
+
+def get_transcript_cache_path(source_id, backend, model_size):
+    """
+    Get the path of a source's cached word-level transcript. Each ASR backend
+    and model size gets its own, so a tiny transcript never stands in for large.
+    """
+    return os.path.join(
+        app.config["TRANSCRIPTS_FOLDER"],
+        f"source_{source_id}_{backend}_{model_size}.json",
+    )
+
+
+def load_source_transcript(source_id, backend, model_size):
+    """Load a source's cached word-level segments, or None if not cached"""
+    path = get_transcript_cache_path(source_id, backend, model_size)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return [[tuple(word) for word in segment] for segment in data["segments"]]
+    except Exception as e:
+        print(f"Error loading cached transcript for source {source_id}: {e}")
+        return None
+
+
+def save_source_transcript(source_id, segments, backend, model_size):
+    path = get_transcript_cache_path(source_id, backend, model_size)
+    data = {
+        "source_id": source_id,
+        "backend": backend,
+        "model_size": model_size,
+        "created_at": datetime.utcnow().isoformat(),
+        "segments": segments,
+    }
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def invalidate_source_transcript(source_id):
+    """Drop a source's cached transcripts, for every backend and model size"""
+    folder = app.config["TRANSCRIPTS_FOLDER"]
+    # source_<id>.json is the name used before transcripts were keyed by model
+    paths = glob.glob(os.path.join(folder, f"source_{source_id}_*.json"))
+    paths.append(os.path.join(folder, f"source_{source_id}.json"))
+    for path in paths:
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except Exception as e:
+                print(f"Error removing cached transcript {path}: {e}")
+
+
+def get_source_transcript(source_id, fetch_media, model_size="base", backend=None):
+    """
+    Get the word-level transcript of a whole source, transcribing it once.
+
+    Args:
+        source_id: ID of the YouTubeSource
+        fetch_media: Callable returning the path of the source's media, only
+            called on a cache miss
+        model_size: Whisper model size, part of the cache key
+        backend: ASR backend name (the default backend if None), part of the
+            cache key
+
+    Returns:
+        list: Segments of (start, end, word) tuples on the source's timeline
+    """
+    from generate_captions import asr_slots, get_asr_backend, transcribe_word_segments
+
+    backend = get_asr_backend(backend).name
+    with get_source_lock(source_id, backend, model_size):
+        segments = load_source_transcript(source_id, backend, model_size)
+        if segments is not None:
+            return segments
+
+        media_file = fetch_media()
+        print(f"Transcribing source {source_id} once for all of its shorts")
+        with asr_slots:
+            segments = transcribe_word_segments(
+                media_file, model_size=model_size, backend=backend
+            )
+        save_source_transcript(source_id, segments, backend, model_size)
+        return segments
@@ -0,0 +1,132 @@
+from array import array
+import bisect
+import struct
+
+from summaries_yt import format_transcript, parse_transcript
+
+# Header of the binary format: magic, snippet count, UTF-8 text length
+HEADER = struct.Struct("<4sII")
+MAGIC = b"TRX1"
+
+
+class TranscriptIndex:
+    """
+    Timestamped transcript stored as parallel arrays: snippet start times,
+    durations and offsets into one concatenated text.
+
+    Snippets are sorted by start, so the snippets around a time range are found
+    with a binary search instead of re-parsing the transcript string.
+    """
+
+    def __init__(self, starts=None, durations=None, offsets=None, text=""):
+        self.starts = starts if starts is not None else array("d")
+        self.durations = durations if durations is not None else array("d")
+        self.offsets = offsets if offsets is not None else array("I", [0])
+        self.text = text
+        self.max_duration = max(self.durations, default=0.0)
+
+    @classmethod
+    def from_snippets(cls, snippets):
+        """Build an index from (start, duration, text) tuples"""
+        snippets = sorted(snippets, key=lambda snippet: snippet[0])
+        starts, durations, offsets = array("d"), array("d"), array("I", [0])
+        texts = []
+        length = 0
+        for start, duration, text in snippets:
+            starts.append(float(start))
+            durations.append(float(duration))
+            texts.append(text)
+            length += len(text)
+            offsets.append(length)
+        return cls(starts, durations, offsets, "".join(texts))
+
+    @classmethod
+    def from_transcript(cls, transcript):
+        """Build an index from a transcript string made by get_transcript"""
+        return cls.from_snippets(parse_transcript(transcript))
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, count, text_length = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not a transcript index")
+        position = HEADER.size
+
+        def read(typecode, length):
+            nonlocal position
+            values = array(typecode)
+            size = values.itemsize * length
+            values.frombytes(data[position : position + size])
+            position += size
+            return values
+
+        starts = read("d", count)
+        durations = read("d", count)
+        offsets = read("I", count + 1)
+        text = bytes(data[position : position + text_length]).decode("utf-8")
+        return cls(starts, durations, offsets, text)
+
+    def to_bytes(self):
+        """Serialize to the compact column format stored on YouTubeSource"""
+        text = self.text.encode("utf-8")
+        return b"".join(
+            [
+                HEADER.pack(MAGIC, len(self.starts), len(text)),
+                self.starts.tobytes(),
+                self.durations.tobytes(),
+                self.offsets.tobytes(),
+                text,
+            ]
+        )
+
+    def __len__(self):
+        return len(self.starts)
+
+    def snippet(self, i):
+        """Get snippet i as (start, duration, text)"""
+        return (
+            self.starts[i],
+            self.durations[i],
+            self.text[self.offsets[i] : self.offsets[i + 1]],
+        )
+
+    def snippets(self):
+        return [self.snippet(i) for i in range(len(self))]
+
+    def bounds(self, start_time, end_time):
+        """Index range [lo, hi) of the snippets overlapping [start_time, end_time)"""
+        # No snippet starting earlier than this can reach start_time
+        lo = bisect.bisect_left(self.starts, start_time - self.max_duration)
+        hi = bisect.bisect_left(self.starts, end_time)
+        while lo < hi and self.starts[lo] + self.durations[lo] <= start_time:
+            lo += 1
+        return lo, hi
+
+    def snippets_between(self, start_time, end_time):
+        """
+        Snippets overlapping [start_time, end_time), plus the snippet right
+        after them so overlapping auto-generated snippets can be cut at the
+        next start.
+        """
+        lo, hi = self.bounds(start_time, end_time)
+        return [self.snippet(i) for i in range(lo, min(hi + 1, len(self)))]
+
+    def text_between(self, start_time, end_time):
+        """Text of the snippets overlapping [start_time, end_time)"""
+        lo, hi = self.bounds(start_time, end_time)
+        return " ".join(
+            self.snippet(i)[2]
+            for i in range(lo, hi)
+            if self.starts[i] + self.durations[i] > start_time
+        )
+
+    def to_transcript(self):
+        """Render the "start:… duration:… text" lines sent to the LLM"""
+        return format_transcript(self.snippets())
+
+
+def load_transcript_index(source):
+    """Get a YouTubeSource's transcript index, parsing older text-only rows"""
+    if source.transcript_data:
+        return TranscriptIndex.from_bytes(source.transcript_data)
+    return TranscriptIndex.from_transcript(source.transcript)
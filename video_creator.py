@@ -1,14 +1,20 @@
 from app import app, db
 from models.models import Image
+from image_store import release_images
 import os
-from moviepy.editor import *
-import animations
 from PIL import Image as PILImage
 from utils import resize_and_crop_image
 import numpy as np
 import threading
+import subprocess
+import shutil
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+VIDEO_FPS = 24
+
 
 # Helper functions
 def get_video_path(video_id, with_subs=False):
@@ -43,7 +49,35 @@ def get_image_path(relative_path):
     return os.path.normpath(os.path.join(app.config["OUTPUT_IMAGES"], filename))
 
 
+def build_image_clip(image_path, animation_type, width, height, duration):
+    """Build the animated clip for a single image"""
+    # moviepy is imported on first use to keep the web process start-up light
+    from moviepy.editor import ImageClip
+    import animations
+
+    # Open and process image
+    pil_image = PILImage.open(image_path).convert("RGBA")
+    pil_image = resize_and_crop_image(pil_image, width, height)
+
+    # Create clip
+    image_clip = ImageClip(np.array(pil_image.convert("RGB")), duration=duration)
+
+    # Apply animation
+    animation_type = animation_type or "fade"
+    if animation_type in ["zoom_in", "zoom_out"]:
+        config = {
+            "zoom_start": 1.0 if animation_type == "zoom_in" else 1.5,
+            "zoom_end": 1.5 if animation_type == "zoom_in" else 1.0,
+        }
+        return animations.apply_animation(
+            image_clip, animation_type=animation_type, config=config
+        )
+    return animations.apply_animation(image_clip, animation_type=animation_type)
+
+
 def create_video_from_images_and_audio(video):
+    from moviepy.editor import AudioFileClip, concatenate_videoclips
+
     try:
         # Get all images for this video
         images = Image.query.filter_by(video_id=video.id).order_by(Image.order).all()
@@ -75,30 +109,9 @@ def create_video_from_images_and_audio(video):
             duration = image.duration or 3.0  # Default duration if not set
 
             try:
-                # Open and process image
-                pil_image = PILImage.open(image_path).convert("RGBA")
-                pil_image = resize_and_crop_image(pil_image, width, height)
-
-                # Create clip
-                image_clip = ImageClip(
-                    np.array(pil_image.convert("RGB")), duration=duration
+                animated_clip = build_image_clip(
+                    image_path, image.animation_type, width, height, duration
                 )
-
-                # Apply animation
-                animation_type = image.animation_type or "fade"
-                if animation_type in ["zoom_in", "zoom_out"]:
-                    config = {
-                        "zoom_start": 1.0 if animation_type == "zoom_in" else 1.5,
-                        "zoom_end": 1.5 if animation_type == "zoom_in" else 1.0,
-                    }
-                    animated_clip = animations.apply_animation(
-                        image_clip, animation_type=animation_type, config=config
-                    )
-                else:
-                    animated_clip = animations.apply_animation(
-                        image_clip, animation_type=animation_type
-                    )
-
                 clips.append(animated_clip)
 
                 # Update progress (10-50% based on image processing)
@@ -139,7 +152,7 @@ def create_video_from_images_and_audio(video):
 
         final_clip.write_videofile(
             video_filename,
-            fps=24,
+            fps=VIDEO_FPS,
             codec="libx264",
             audio_codec="aac",
             threads=4,  # Utilize multiple CPU cores
@@ -184,13 +197,10 @@ def cleanup_temp_files(video, keep_final=True):
                 os.remove(audio_path)
                 video.script.audio_file = None
 
-        # Clean up images
+        # Clean up images, files other videos share are kept until they're done
+        image_paths = [image.file_path for image in video.images if image.file_path]
         for image in video.images:
-            if image.file_path:
-                image_path = get_image_path(image.file_path)
-                if image_path and os.path.exists(image_path):
-                    os.remove(image_path)
-                    image.file_path = None
+            image.file_path = None
 
         # Clean up SRT file
         srt_path = os.path.join(app.config["OUTPUT_FOLDER"], f"video_{video.id}.srt")
@@ -215,6 +225,7 @@ def cleanup_temp_files(video, keep_final=True):
             video.video_with_subs_path = None
 
         db.session.commit()
+        release_images(image_paths)
 
     except Exception as e:
         db.session.rollback()
@@ -270,3 +281,224 @@ def start_video_creation_background(video):
     thread.daemon = True
     thread.start()
     return thread
+
+
+def render_image_segment(image_path, animation_type, width, height, duration, output_path):
+    """Render a single image's animated clip to its own (silent) segment file"""
+    clip = build_image_clip(image_path, animation_type, width, height, duration)
+    try:
+        clip.write_videofile(
+            output_path,
+            fps=VIDEO_FPS,
+            codec="libx264",
+            audio=False,
+            threads=2,
+            logger=None,
+        )
+    finally:
+        clip.close()
+    return output_path
+
+
+def concat_segments_with_audio(segment_paths, audio_file, output_path):
+    """Join rendered segments without re-encoding and mux the narration"""
+    list_path = os.path.join(
+        app.config["TEMP_FOLDER"], f"{os.path.basename(output_path)}.segments.txt"
+    )
+    with open(list_path, "w", encoding="utf8") as f:
+        for path in segment_paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+
+    command = [
+        "ffmpeg",
+        "-y",
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        list_path,
+        "-i",
+        audio_file,
+        "-map",
+        "0:v",
+        "-map",
+        "1:a",
+        "-c:v",
+        "copy",
+        "-c:a",
+        "aac",
+        output_path,
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"Failed to join video segments: {result.stderr[-500:]}")
+    finally:
+        os.remove(list_path)
+    return output_path
+
+
+def create_video_while_narrating(video, speaker="1", language="en"):
+    """
+    Synthesize the narration and render the video at the same time.
+
+    Image i illustrates script line image.order, so its time window is known as
+    soon as the narration reaches the next illustrated line. Each covered
+    window is rendered to a segment in the background while synthesis goes on;
+    the segments are then joined and muxed with the audio.
+    """
+    from generate_audio import (
+        stream_text_to_speech,
+        build_narration_timings,
+        SAMPLE_RATE,
+    )
+
+    script_data = json.loads(video.script.content)
+    lines = script_data.get("script", [])
+
+    available = [
+        image
+        for image in Image.query.filter_by(video_id=video.id).order_by(Image.order)
+        if get_image_path(image.file_path)
+        and os.path.exists(get_image_path(image.file_path))
+    ]
+    images = [image for image in available if image.order < len(lines)]
+    # Images past the last script line share the last line's window
+    extra_images = [image for image in available if image.order >= len(lines)]
+    if not images:
+        raise Exception("No images found for this video")
+    if extra_images:
+        print(
+            f"Video {video.id}: {len(extra_images)} images past the last script "
+            "line are shown with the last one"
+        )
+
+    audio_filename = f"{uuid.uuid4().hex}.wav"
+    audio_file = os.path.join(app.config["OUTPUT_AUDIOS"], audio_filename)
+    segment_dir = os.path.join(app.config["TEMP_FOLDER"], f"video_{video.id}_segments")
+    os.makedirs(segment_dir, exist_ok=True)
+
+    executor = ThreadPoolExecutor(max_workers=2)
+    segments = []
+    chunks = []
+
+    def submit(image, start_sample, end_sample):
+        # Snap window edges to frame boundaries so segments don't drift
+        start_frame = round(start_sample / SAMPLE_RATE * VIDEO_FPS)
+        end_frame = round(end_sample / SAMPLE_RATE * VIDEO_FPS)
+        if end_frame <= start_frame:
+            return
+        image.duration = (end_frame - start_frame) / VIDEO_FPS
+        segment_path = os.path.join(segment_dir, f"segment_{image.order:04d}.mp4")
+        segments.append(
+            executor.submit(
+                render_image_segment,
+                get_image_path(image.file_path),
+                image.animation_type,
+                video.width,
+                video.height,
+                image.duration,
+                segment_path,
+            )
+        )
+
+    try:
+        current = 0
+        window_start = 0
+        total_samples = 0
+        for chunk in stream_text_to_speech(lines, audio_file, speaker, language):
+            # The current image is covered once the next illustrated line starts
+            while (
+                current + 1 < len(images)
+                and chunk["line"] >= images[current + 1].order
+            ):
+                submit(images[current], window_start, chunk["offset"])
+                window_start = chunk["offset"]
+                current += 1
+
+            chunk.pop("wav")
+            chunks.append(chunk)
+            total_samples = chunk["offset"] + chunk["samples"]
+            video.progress = int((chunk["index"] + 1) / chunk["total"] * 80)
+            video.last_updated = datetime.utcnow()
+            db.session.commit()
+
+        tail = [images[current]] + extra_images
+        for i, image in enumerate(tail):
+            submit(
+                image,
+                window_start + (total_samples - window_start) * i // len(tail),
+                window_start + (total_samples - window_start) * (i + 1) // len(tail),
+            )
+
+        segment_paths = [future.result() for future in segments]
+
+        video.script.audio_file = audio_filename
+        video.script.audio_duration = total_samples / float(SAMPLE_RATE)
+        video.script.timings = json.dumps(
+            build_narration_timings(chunks, len(lines), language)
+        )
+        video.progress = 90
+        video.last_updated = datetime.utcnow()
+        db.session.commit()
+
+        video_filename = get_video_path(video.id)
+        concat_segments_with_audio(segment_paths, audio_file, video_filename)
+
+        video.video_path = get_relative_video_path(video.id)
+        video.progress = 100
+        video.last_updated = datetime.utcnow()
+        db.session.commit()
+        return video_filename
+    finally:
+        executor.shutdown(wait=True)
+        shutil.rmtree(segment_dir, ignore_errors=True)
+
+
+def create_video_while_narrating_in_background(video_id, speaker, language):
+    """Generate audio and video together in a background thread"""
+    from models.models import Video  # Import here to avoid circular imports
+
+    try:
+        with app.app_context():
+            video = Video.query.get(video_id)
+            if not video:
+                print(f"Error: Video with ID {video_id} not found")
+                return
+
+            video.status = "processing"
+            video.progress = 0
+            video.error_message = None
+            video.last_updated = datetime.utcnow()
+            db.session.commit()
+
+            create_video_while_narrating(video, speaker, language)
+
+            video.status = "captions_pending"
+            db.session.commit()
+
+            print(f"Video {video_id} narrated and created successfully in background")
+    except Exception as e:
+        try:
+            with app.app_context():
+                video = Video.query.get(video_id)
+                if video:
+                    video.status = "error"
+                    video.error_message = str(e)[:255]  # Limit error message length
+                    video.last_updated = datetime.utcnow()
+                    db.session.commit()
+        except Exception as inner_e:
+            print(f"Error updating video status: {str(inner_e)}")
+        print(f"Error creating video {video_id} in background: {str(e)}")
+
+
+def start_narrated_video_creation_background(video, speaker="1", language="en"):
+    """Start combined audio and video creation in a background thread"""
+    thread = threading.Thread(
+        target=create_video_while_narrating_in_background,
+        args=(video.id, speaker, language),
+    )
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import threading
+
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+
+class VoiceRegistry:
+    """
+    Indexed view of voice_overs.json shared by the audio route and the TTS.
+
+    The file is parsed once and indexed by (language, voice id). Sample files
+    are resolved, validated and hashed at load time, and the registry only
+    reloads when the JSON file's mtime changes.
+    """
+
+    def __init__(
+        self,
+        path="voice_overs.json",
+        default_sample="./resources/audio.wav",
+        resources_dir="./resources",
+    ):
+        self.path = path
+        self.default_sample = default_sample
+        self.resources_dir = resources_dir
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._loaded = False
+        self._voice_overs = {}
+        self._index = {}
+        self._fallback_sample = None
+
+    def _resolve_sample(self, sample):
+        """Resolve a sample path, accepting /static/... URLs relative to the project"""
+        if not sample:
+            return None
+        for candidate in (sample, os.path.join(BASE_DIR, sample.lstrip("/\\"))):
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def _hash_file(self, path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _find_fallback_sample(self):
+        if os.path.isfile(self.default_sample):
+            return self.default_sample
+        # Use the first available sample file in resources
+        if os.path.exists(self.resources_dir):
+            for root, _, files in os.walk(self.resources_dir):
+                for file in sorted(files):
+                    if file.endswith((".wav", ".mp3")):
+                        return os.path.join(root, file)
+        return None
+
+    def _load(self, mtime):
+        try:
+            with open(self.path, "r", encoding="utf8") as f:
+                voice_overs = json.load(f)
+        except Exception as e:
+            print(f"Error loading voice overs: {e}")
+            voice_overs = {}
+
+        index = {}
+        for language, language_data in voice_overs.items():
+            for voice in language_data.get("voices", []):
+                sample_path = self._resolve_sample(voice.get("sample"))
+                if sample_path is None:
+                    print(
+                        f"Warning: Sample file {voice.get('sample')} for voice "
+                        f"{language}/{voice['id']} not found, using default"
+                    )
+                index[(language, str(voice["id"]))] = {
+                    **voice,
+                    "sample_path": sample_path,
+                    "sample_sha256": self._hash_file(sample_path) if sample_path else None,
+                }
+
+        self._voice_overs = voice_overs
+        self._index = index
+        self._fallback_sample = self._find_fallback_sample()
+        self._mtime = mtime
+        self._loaded = True
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if self._loaded and mtime == self._mtime:
+            return
+        with self._lock:
+            if not self._loaded or mtime != self._mtime:
+                self._load(mtime)
+
+    def voice_overs(self):
+        """Get the voice_overs.json data, keyed by language"""
+        self._refresh()
+        return self._voice_overs
+
+    def get_voice(self, voice_id, language="en"):
+        """Get the indexed voice entry, or None if it doesn't exist"""
+        self._refresh()
+        return self._index.get((language, str(voice_id)))
+
+    def get_sample(self, voice_id, language="en"):
+        """Get the voice sample path for a given voice ID and language"""
+        voice = self.get_voice(voice_id, language)
+        if voice and voice["sample_path"]:
+            return voice["sample_path"]
+
+        if self._fallback_sample:
+            return self._fallback_sample
+
+        raise FileNotFoundError(
+            f"No voice sample files found. Please ensure voice sample files exist in {self.resources_dir} or the path specified in {self.path}"
+        )
+
+
+voice_registry = VoiceRegistry()